@@ -1,32 +1,36 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.models.user import User
 from app.db.models.user_info import UserInfo
 from app.db.models.notifications import Notification
 from app.schemas.user import *
 from app.schemas.token import Token
-from app.core.security import hash_password, verify_password, create_access_token
-from app.db.session import get_db
+from app.core.security import create_access_token
+from app.core.hashing import hash_password, verify_and_update_password
+from app.core import notifications
+from app.db.session import get_db, get_async_db
 
 
 router = APIRouter()
 
 
 @router.post("/register") 
-def register(user_in: UserBase, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == user_in.email).first()
+async def register(user_in: UserBase, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(User).filter(User.email == user_in.email))
+    user = result.scalars().first()
     if user:
         raise HTTPException(status_code=400, detail="Email already registered")
     new_user = User(
         email= user_in.email,
         first_name= user_in.first_name,
         last_name= user_in.last_name,
-        password=hash_password(user_in.password),
+        password=await hash_password(user_in.password),
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.flush()
 
     # Create UserInfo entry
     user_info = UserInfo(
@@ -35,39 +39,51 @@ def register(user_in: UserBase, db: Session = Depends(get_db)):
      
    
     db.add(user_info)
-    db.commit()
-    db.refresh(user_info)
 
-    admins = db.query(User).filter(User.role == "admin").all()
-    for admin in admins:
+    admin_ids = (await db.execute(select(User.id).filter(User.role == "admin"))).scalars().all()
+    for admin_id in admin_ids:
         notification = Notification(
-            user_id=admin.id,
+            user_id=admin_id,
             message=f"New user registered: {new_user.email}",
             type="new_user",
             related_user_id=new_user.id
         )
         db.add(notification)
-    db.commit()
+    if admin_ids:
+        await db.execute(notifications.record_new_statement(admin_ids))
+    await db.commit()
+    notifications.publish_new(*admin_ids)
 
     return {"msg": "User registered successfully"}
 
 @router.post("/login", response_model=Token,)
-async def login( db: Session = Depends(get_db),form_data: OAuth2PasswordRequestForm = Depends()):
-    user = db.query(User).options(joinedload(User.user_info)).filter(User.email == form_data.username).first()
+async def login( db: AsyncSession = Depends(get_async_db),form_data: OAuth2PasswordRequestForm = Depends()):
+    result = await db.execute(
+        select(User).options(joinedload(User.user_info)).filter(User.email == form_data.username)
+    )
+    user = result.scalars().first()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
         )
-    if not verify_password(form_data.password, user.password):
+    valid, new_hash = await verify_and_update_password(form_data.password, user.password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
         )
 
+    # Stored hash uses old bcrypt parameters, upgrade it while we have the password
+    if new_hash:
+        user.password = new_hash
+        await db.commit()
+
     token_data = {
         "sub": user.email,
+        "user_id": user.id,
         "role": user.role,
+        "verified": bool(user.user_info and user.user_info.is_verified),
     }
 
     #check of admin
@@ -1,4 +1,4 @@
-from fastapi import APIRouter,Depends,HTTPException,status,File,UploadFile,Body
+from fastapi import APIRouter,BackgroundTasks,Depends,HTTPException,status,File,UploadFile,Body,Query
 import time
 import logging
 from sqlalchemy.exc import SQLAlchemyError
@@ -6,62 +6,111 @@ from app.db.models.user import User
 from app.db.models.post import Post
 from app.db.models.like import Like
 from app.db.models.user_info import UserInfo
-from app.schemas.user import UserOut,ConnectionRequestWithUser
+from app.db.models.suggestion import UserSuggestion
+from app.schemas.user import UserOut,ConnectionRequestWithUser,SuggestedUserPage
 from app.schemas.user_info import UserInfoResponse, UserInfoUpdate
-from app.db.session import get_db
-from typing import List
+from app.db.session import get_db, get_async_db
+from typing import List, Optional
+from sqlalchemy import select, exists, literal
 from sqlalchemy.orm import Session
-from app.core.security import get_current_user
-from cloudinary import uploader
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.security import get_current_user, Principal
 from cloudinary.exceptions import Error as CloudinaryError
 from app.db.models.connection_request import ConnectionRequest
-from app.schemas.post import PostOut
+from app.schemas.post import PostOut, PostPage
+from app.core.pagination import encode_cursor, decode_cursor
+from app.core.suggestions import connection_exists
+from app.core import media
+from app.routers.post import with_pending_likes
 
 
 router = APIRouter()
 
-#get user who are  not friends with the current user
-# This endpoint fetches a list of users who are not friends with the current user.
-# It excludes users who have sent connection requests to the current user.
-@router.get("/suggested", response_model=List[UserOut])
+# People you may know, ranked by mutual friends
+# Lists are precomputed by app.core.suggestions; users who connected since the
+# last refresh are filtered out at read time. Once the precomputed list runs
+# out (always, for users without friends yet) the remaining non-connected
+# users follow, newest accounts first.
+@router.get("/suggested", response_model=SuggestedUserPage)
 def get_suggested_users(
+    cursor: Optional[str] = None,
+    page_size: int = Query(20, ge=1, le=50),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    # Subquery to find all users with existing connection requests
-    connection_subquery = (
-        db.query(ConnectionRequest.sender_id.label("user_id"))
-        .filter(ConnectionRequest.receiver_id == current_user.id)
-        .union_all(
-            db.query(ConnectionRequest.receiver_id.label("user_id"))
-            .filter(ConnectionRequest.sender_id == current_user.id)
-        )
-        .subquery()
-    )
-
-    # Main query
-    suggested_users = (
-        db.query(User, UserInfo)
-        .outerjoin(UserInfo, User.id == UserInfo.user_id)
+    rank, fallback, before_user_id = None, False, None
+    if cursor:
+        values = decode_cursor(cursor)
+        fallback = values.get("fallback") is True
+        rank, before_user_id = values.get("rank"), values.get("before_user_id")
+        if fallback and before_user_id is not None and not isinstance(before_user_id, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if not fallback and not isinstance(rank, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    items = []
+    if not fallback:
+        query = db.query(UserSuggestion, User, UserInfo.profile_picture)\
+            .join(User, User.id == UserSuggestion.suggested_user_id)\
+            .outerjoin(UserInfo, User.id == UserInfo.user_id)\
+            .filter(
+                UserSuggestion.user_id == current_user.id,
+                ~connection_exists(UserSuggestion.user_id, UserSuggestion.suggested_user_id)
+            )
+        if rank is not None:
+            query = query.filter(UserSuggestion.rank > rank)
+        suggested_users = query.order_by(UserSuggestion.rank).limit(page_size + 1).all()
+        if len(suggested_users) > page_size:
+            suggested_users = suggested_users[:page_size]
+            return {
+                "items": [
+                    suggested_user_item(user, profile_picture, suggestion.mutual_count)
+                    for suggestion, user, profile_picture in suggested_users
+                ],
+                "next_cursor": encode_cursor(rank=suggested_users[-1][0].rank)
+            }
+        items = [
+            suggested_user_item(user, profile_picture, suggestion.mutual_count)
+            for suggestion, user, profile_picture in suggested_users
+        ]
+
+    # Everyone else the user isn't connected to, below the mutual-friend candidates
+    remaining = page_size - len(items)
+    query = db.query(User, UserInfo.profile_picture)\
+        .outerjoin(UserInfo, User.id == UserInfo.user_id)\
         .filter(
-            User.role != "admin",
             User.id != current_user.id,
-            ~User.id.in_(db.query(connection_subquery.c.user_id))
+            User.role != "admin",
+            ~connection_exists(literal(current_user.id), User.id),
+            ~exists().where(
+                UserSuggestion.user_id == current_user.id,
+                UserSuggestion.suggested_user_id == User.id
+            )
         )
-        .all()
-    )
+    if before_user_id is not None:
+        query = query.filter(User.id < before_user_id)
+    others = query.order_by(User.id.desc()).limit(remaining + 1).all()
 
-    return [
-        {
-            "id": user.id,
-            "email": user.email,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "role": user.role,
-            "profile_picture": user_info.profile_picture if user_info else None
-        }
-        for user, user_info in suggested_users
-    ]
+    has_more = len(others) > remaining
+    others = others[:remaining]
+    items += [suggested_user_item(user, profile_picture, 0) for user, profile_picture in others]
+    next_cursor = None
+    if has_more:
+        last_id = others[-1][0].id if others else before_user_id
+        next_cursor = encode_cursor(fallback=True, before_user_id=last_id)
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def suggested_user_item(user: User, profile_picture: Optional[str], mutual_friends: int) -> dict:
+    return {
+        "id": user.id,
+        "email": user.email,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "role": user.role,
+        "profile_picture": profile_picture,
+        "mutual_friends": mutual_friends
+    }
 
 
 # Get user details
@@ -69,7 +118,7 @@ def get_suggested_users(
 @router.get("/me", response_model=UserOut)
 def get_user_me(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     # Fetch user and user info
     # Use outerjoin to include user info even if it doesn't exist
@@ -97,14 +146,16 @@ def get_user_me(
 
 @router.put("/me/update-bio", response_model=UserInfoResponse)
 async def update_bio(
+    background_tasks: BackgroundTasks,
     user_info_update: UserInfoUpdate = Body(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     try:
-        user_info = db.query(UserInfo).filter(
+        result = await db.execute(select(UserInfo).filter(
             UserInfo.user_id == current_user.id
-        ).first()
+        ))
+        user_info = result.scalars().first()
 
         update_data = user_info_update.dict(exclude_unset=True)
         old_public_id = None
@@ -121,10 +172,7 @@ async def update_bio(
             if 'profile_picture' in update_data and update_data['profile_picture'] is None:
                 user_info.profile_public_id = None
                 if old_public_id:
-                    try:
-                        uploader.destroy(old_public_id)
-                    except CloudinaryError as e:
-                        logging.error(f"Cloudinary delete error: {str(e)}")
+                    background_tasks.add_task(media.destroy, old_public_id)
         else:
             # Create new entry
             user_info = UserInfo(
@@ -133,12 +181,12 @@ async def update_bio(
             )
             db.add(user_info)
 
-        db.commit()
-        db.refresh(user_info)
+        await db.commit()
+        await db.refresh(user_info)
         return user_info
 
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f"Database error: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -150,13 +198,15 @@ async def update_bio(
 #add user profile picture
 @router.put("/me/add-profile-picture", response_model=UserInfoResponse)
 async def update_profile_picture(
+    background_tasks: BackgroundTasks,
     profile_picture: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    existing_info = db.query(UserInfo).filter(
+    result = await db.execute(select(UserInfo).filter(
         UserInfo.user_id == current_user.id
-    ).first()
+    ))
+    existing_info = result.scalars().first()
 
     profile_data = {}
     try:
@@ -171,7 +221,8 @@ async def update_profile_picture(
             raise HTTPException(400, "File too large (max 5MB)")
 
         await profile_picture.seek(0)
-        upload_result = uploader.upload(
+        # Off the event loop, in the media thread pool
+        upload_result = await media.upload(
             await profile_picture.read(),
             folder="profile_pics",
             public_id=f"user_{current_user.id}_{int(time.time())}",
@@ -206,26 +257,21 @@ async def update_profile_picture(
             )
             db.add(existing_info)
         
-        db.commit()
-        db.refresh(existing_info)
+        await db.commit()
+        await db.refresh(existing_info)
 
         # Delete old image after successful update
         if old_public_id:
-            try:
-                uploader.destroy(old_public_id)
-            except CloudinaryError as e:
-                logging.error(f"Failed to delete old image: {str(e)}")
+            background_tasks.add_task(media.destroy, old_public_id)
 
         return existing_info
 
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f"Database error: {str(e)}")
+        # Background tasks don't run for error responses, so clean up here
         if profile_data.get("profile_public_id"):
-            try:
-                uploader.destroy(profile_data["profile_public_id"])
-            except CloudinaryError as ce:
-                logging.error(f"Cloudinary cleanup error: {str(ce)}")
+            await media.destroy(profile_data["profile_public_id"])
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to save profile picture"
@@ -238,7 +284,7 @@ async def update_profile_picture(
 @router.get("/me/bio", response_model=UserInfoResponse)
 def get_user_bio(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     user_info = db.query(UserInfo).filter(
         UserInfo.user_id == current_user.id,
@@ -258,7 +304,7 @@ def get_user_bio(
 @router.get("/me/requests", response_model=List[ConnectionRequestWithUser])
 def get_connection_requests(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     # Get all pending requests sent to current user
     requests = db.query(User, ConnectionRequest, UserInfo)\
@@ -288,24 +334,32 @@ def get_connection_requests(
 
     return response
 
-#get posts liked by the current user
-@router.get("/me/liked-posts", response_model=List[PostOut])
+#get posts liked by the current user, most recently liked first
+@router.get("/me/liked-posts", response_model=PostPage)
 def get_liked_posts(
+    cursor: Optional[str] = None,
+    page_size: int = Query(20, ge=1, le=50),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    # Fetch posts liked by the current user
-    liked_posts = db.query(Post)\
+    query = db.query(Post, Like.id)\
         .join(Like, Post.id == Like.post_id)\
         .filter(
             Like.user_id == current_user.id
-        )\
-        .all()
-    
-    if not liked_posts:
-        return []  # Return an empty list if no liked posts are found
-    
-    return liked_posts
+        )
+    if cursor:
+        like_id = decode_cursor(cursor).get("like_id")
+        if not isinstance(like_id, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(Like.id < like_id)
+    liked_posts = query.order_by(Like.id.desc()).limit(page_size + 1).all()
+
+    has_more = len(liked_posts) > page_size
+    liked_posts = liked_posts[:page_size]
+    return {
+        "items": [with_pending_likes(post) for post, _ in liked_posts],
+        "next_cursor": encode_cursor(like_id=liked_posts[-1][1]) if has_more else None
+    }
 
 # check user verification status
 @router.get("/status/{user_id}", status_code=status.HTTP_200_OK)
@@ -0,0 +1,166 @@
+"""Write-behind persistence for chat messages, enabled with CHAT_WRITE_BEHIND.
+
+Messages take their id from the table's sequence up front, are broadcast
+straight away and queued here. A background task writes the queue in one
+transaction every CHAT_FLUSH_MS milliseconds, or sooner once
+CHAT_FLUSH_BATCH messages are waiting, and resolves each message's future
+so the sender can be told it is durable. A batch that fails is retried with
+backoff, then written one message at a time so a single bad row only loses
+itself.
+"""
+import asyncio
+import logging
+import os
+from collections import deque
+from sqlalchemy import insert, text
+from app.db.models.message import Message
+from app.db.models.group import GroupMessage
+from app.db.session import async_engine, AsyncSessionLocal
+from app.core import conversations
+
+ENABLED = os.getenv("CHAT_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+FLUSH_MS = float(os.getenv("CHAT_FLUSH_MS", "20"))
+FLUSH_BATCH = int(os.getenv("CHAT_FLUSH_BATCH", "500"))
+# Ids reserved per sequence round trip. Blocks are only ordered within one
+# worker, so keep this at 1 when running several.
+ID_BLOCK = int(os.getenv("CHAT_ID_BLOCK", "1"))
+FLUSH_RETRIES = int(os.getenv("CHAT_FLUSH_RETRIES", "5"))
+# Doubled after every failed attempt
+RETRY_MS = float(os.getenv("CHAT_FLUSH_RETRY_MS", "100"))
+
+
+class IdAllocator:
+    def __init__(self, sequence: str, block: int):
+        self.sequence = sequence
+        self.block = block
+        self._ids = deque()
+        self._lock = asyncio.Lock()
+
+    async def next(self) -> int:
+        async with self._lock:
+            if not self._ids:
+                async with async_engine.connect() as connection:
+                    result = await connection.execute(
+                        text(f"SELECT nextval('{self.sequence}') FROM generate_series(1, :n)"), {"n": self.block}
+                    )
+                    self._ids.extend(result.scalars().all())
+            return self._ids.popleft()
+
+
+def _message_row(message: Message) -> dict:
+    return {
+        "id": message.id,
+        "sender_id": message.sender_id,
+        "receiver_id": message.receiver_id,
+        "content": message.content,
+        "timestamp": message.timestamp,
+        "is_read": False,
+    }
+
+
+def _group_message_row(message: GroupMessage) -> dict:
+    return {
+        "id": message.id,
+        "group_id": message.group_id,
+        "sender_id": message.sender_id,
+        "content": message.content,
+        "timestamp": message.timestamp,
+    }
+
+
+class ChatWriter:
+    def __init__(self, flush_ms: float, batch_size: int):
+        self.flush_ms = flush_ms
+        self.batch_size = batch_size
+        self.message_ids = IdAllocator("messages_id_seq", ID_BLOCK)
+        self.group_message_ids = IdAllocator("group_messages_id_seq", ID_BLOCK)
+        self._pending = []  # (Message or GroupMessage, future)
+        self._full = asyncio.Event()
+        self._stopping = False
+        self._task = None
+
+    def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Let a flush in progress finish instead of cancelling it mid-commit
+        if self._task:
+            self._stopping = True
+            self._full.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def submit(self, message) -> asyncio.Future:
+        """Queue a Message or GroupMessage with its id set, resolved once committed."""
+        durable = asyncio.get_running_loop().create_future()
+        self._pending.append((message, durable))
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+        return durable
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+    async def flush(self):
+        while self._pending:
+            # Stays queued until it has been written or given up on, so a
+            # cancelled flush leaves it for the next one
+            batch = self._pending[:self.batch_size]
+            errors = await self._write_batch([m for m, _ in batch])
+            del self._pending[:len(batch)]
+            for (message, durable), error in zip(batch, errors):
+                if durable.done():
+                    continue
+                if error is None:
+                    durable.set_result(message.id)
+                else:
+                    # Already delivered to recipients; the sender is told it wasn't saved
+                    durable.set_exception(error)
+
+    async def _write_batch(self, messages: list) -> list:
+        """Write messages, returning the error each one failed with or None."""
+        for attempt in range(FLUSH_RETRIES + 1):
+            try:
+                await self._write(messages)
+                return [None] * len(messages)
+            except Exception:
+                if attempt == FLUSH_RETRIES:
+                    logging.exception(f"chat write-behind could not write {len(messages)} messages, writing one by one")
+                    break
+                logging.warning(f"chat write-behind failed to write {len(messages)} messages, retrying", exc_info=True)
+                await asyncio.sleep(RETRY_MS / 1000 * 2 ** attempt)
+
+        errors = []
+        for message in messages:
+            try:
+                await self._write([message])
+                errors.append(None)
+            except Exception as exc:
+                logging.exception(f"chat write-behind lost message {message.id}")
+                errors.append(exc)
+        return errors
+
+    @staticmethod
+    async def _write(batch: list):
+        messages = [m for m in batch if isinstance(m, Message)]
+        group_messages = [m for m in batch if isinstance(m, GroupMessage)]
+        async with AsyncSessionLocal() as db:
+            if messages:
+                await db.execute(insert(Message).values([_message_row(m) for m in messages]))
+                await db.execute(conversations.record_messages_statement(messages))
+            if group_messages:
+                await db.execute(insert(GroupMessage).values([_group_message_row(m) for m in group_messages]))
+            await db.commit()
+
+writer = ChatWriter(FLUSH_MS, FLUSH_BATCH)
@@ -0,0 +1,92 @@
+from sqlalchemy import case, update, func
+from sqlalchemy.dialects.postgresql import insert
+from app.db.models.conversation import Conversation
+from app.db.models.message import Message
+
+PREVIEW_LENGTH = 200
+
+
+def participants(user_id: int, other_id: int) -> tuple:
+    return (user_id, other_id) if user_id < other_id else (other_id, user_id)
+
+
+def record_message_statement(message: Message):
+    """Upsert the pair's summary for a newly persisted message.
+
+    Unread counters are incremented in the database, and last_* fields only
+    move forward so concurrent senders can't overwrite a newer message.
+    """
+    return record_messages_statement([message])
+
+
+def record_messages_statement(messages: list):
+    """Like record_message_statement for a batch, one row per pair."""
+    summaries = {}
+    for message in sorted(messages, key=lambda m: m.id):
+        low_id, high_id = participants(message.sender_id, message.receiver_id)
+        summary = summaries.setdefault((low_id, high_id), {
+            "user_low_id": low_id, "user_high_id": high_id, "unread_low": 0, "unread_high": 0,
+        })
+        summary.update(
+            last_message_id=message.id,
+            last_sender_id=message.sender_id,
+            last_message_preview=(message.content or "")[:PREVIEW_LENGTH],
+            last_message_at=message.timestamp,
+        )
+        summary["unread_low" if message.receiver_id == low_id else "unread_high"] += 1
+
+    statement = insert(Conversation).values(list(summaries.values()))
+    excluded = statement.excluded
+    is_newer = Conversation.last_message_id.is_(None) | (excluded.last_message_id > Conversation.last_message_id)
+
+    def newer(column):
+        return case((is_newer, getattr(excluded, column)), else_=getattr(Conversation, column))
+
+    return statement.on_conflict_do_update(
+        index_elements=[Conversation.user_low_id, Conversation.user_high_id],
+        set_={
+            "last_message_id": newer("last_message_id"),
+            "last_sender_id": newer("last_sender_id"),
+            "last_message_preview": newer("last_message_preview"),
+            "last_message_at": newer("last_message_at"),
+            "unread_low": Conversation.unread_low + excluded.unread_low,
+            "unread_high": Conversation.unread_high + excluded.unread_high,
+        },
+    )
+
+
+def mark_read_statement(reader_id: int, sender_id: int, count: int = 1):
+    """Decrement the reader's unread counter for the pair, never below zero."""
+    low_id, high_id = participants(reader_id, sender_id)
+    column = "unread_low" if reader_id == low_id else "unread_high"
+    current = getattr(Conversation, column)
+    return update(Conversation).where(
+        Conversation.user_low_id == low_id,
+        Conversation.user_high_id == high_id,
+    ).values({column: case((current > count, current - count), else_=0)})
+
+
+def read_up_to_statement(reader_id: int, sender_id: int, message_id: int):
+    """Flag every unread message from sender_id up to message_id as read, in one statement."""
+    return update(Message).where(
+        Message.sender_id == sender_id,
+        Message.receiver_id == reader_id,
+        Message.id <= message_id,
+        Message.is_read == False
+    ).values(is_read=True)
+
+
+def advance_watermark_statement(reader_id: int, sender_id: int, message_id: int, count: int):
+    """Move the reader's watermark forward and take count off their unread
+    counter, returning the stored watermark."""
+    low_id, high_id = participants(reader_id, sender_id)
+    side = "low" if reader_id == low_id else "high"
+    read_up_to = getattr(Conversation, f"read_{side}_id")
+    unread = getattr(Conversation, f"unread_{side}")
+    return update(Conversation).where(
+        Conversation.user_low_id == low_id,
+        Conversation.user_high_id == high_id,
+    ).values({
+        read_up_to: func.greatest(read_up_to, message_id),
+        unread: case((unread > count, unread - count), else_=0),
+    }).returning(read_up_to)
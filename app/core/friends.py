@@ -0,0 +1,128 @@
+"""Process-local index of accepted connections.
+
+Friend sets are loaded from connection_requests on first use, kept in a
+bounded LRU and patched in place from "friendships" events, so are_friends
+and friend listings don't query the database on every call.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+from sqlalchemy import select, union
+from app.db.models.connection_request import ConnectionRequest
+from app.core.cache import TTLCache
+from app.core import pubsub
+
+FRIENDSHIPS_CHANNEL = "friendships"
+
+
+def friend_ids_query(user_id: int):
+    return union(
+        select(ConnectionRequest.receiver_id.label("friend_id")).filter(
+            ConnectionRequest.sender_id == user_id, ConnectionRequest.status == "accepted"
+        ),
+        select(ConnectionRequest.sender_id.label("friend_id")).filter(
+            ConnectionRequest.receiver_id == user_id, ConnectionRequest.status == "accepted"
+        ),
+    )
+
+
+class FriendGraph:
+    """Adjacency sets for the users seen recently, user_id -> frozenset of friend ids.
+
+    Every edge event bumps a generation and records it against both users. A
+    load started before an event that touched its user is returned but not
+    cached, since its query may have missed that change.
+    """
+
+    # Users whose last event generation is remembered; older ones fall back to _floor
+    MAX_TOUCHED = 10000
+
+    def __init__(self, max_users: int, ttl: float):
+        self._cache = TTLCache(max_users, ttl)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._touched = OrderedDict()  # user_id -> generation of its last event
+        self._floor = 0  # newest generation forgotten from _touched
+
+    def get(self, user_id: int) -> Optional[frozenset]:
+        return self._cache.get(user_id)
+
+    def generation(self) -> int:
+        """Take before querying a user's friends, then pass to load()."""
+        return self._generation
+
+    def load(self, user_id: int, friend_ids, generation: Optional[int] = None) -> frozenset:
+        friends = frozenset(friend_ids)
+        with self._lock:
+            if generation is None or self._touched.get(user_id, self._floor) <= generation:
+                self._cache.set(user_id, friends)
+        return friends
+
+    def _touch(self, *user_ids: int):
+        self._generation += 1
+        for user_id in user_ids:
+            self._touched[user_id] = self._generation
+            self._touched.move_to_end(user_id)
+        while len(self._touched) > self.MAX_TOUCHED:
+            _, generation = self._touched.popitem(last=False)
+            self._floor = max(self._floor, generation)
+
+    def add_edge(self, user_id: int, friend_id: int):
+        # Only users already loaded are patched, the rest load fresh later.
+        # Sets are replaced rather than mutated so readers can iterate safely.
+        with self._lock:
+            self._touch(user_id, friend_id)
+            for a, b in ((user_id, friend_id), (friend_id, user_id)):
+                friends = self._cache.get(a)
+                if friends is not None:
+                    self._cache.set(a, friends | {b})
+
+    def invalidate(self, *user_ids: int):
+        with self._lock:
+            self._touch(*user_ids)
+            self._cache.invalidate(*user_ids)
+
+    def clear(self):
+        with self._lock:
+            self._touch()
+            self._floor = self._generation
+            self._touched.clear()
+            self._cache.clear()
+
+
+friend_graph = FriendGraph(
+    int(os.getenv("FRIEND_GRAPH_SIZE", "50000")),
+    float(os.getenv("FRIEND_GRAPH_TTL", "600")),
+)
+
+
+def get_friend_ids(db, user_id: int) -> frozenset:
+    friends = friend_graph.get(user_id)
+    if friends is None:
+        generation = friend_graph.generation()
+        friends = friend_graph.load(user_id, db.execute(friend_ids_query(user_id)).scalars().all(), generation)
+    return friends
+
+
+async def async_get_friend_ids(db, user_id: int) -> frozenset:
+    friends = friend_graph.get(user_id)
+    if friends is None:
+        generation = friend_graph.generation()
+        result = await db.execute(friend_ids_query(user_id))
+        friends = friend_graph.load(user_id, result.scalars().all(), generation)
+    return friends
+
+
+# Call after the change is committed, every worker's index applies it
+def publish_friendship_added(user_id: int, friend_id: int):
+    pubsub.publish(FRIENDSHIPS_CHANNEL, {"type": "added", "user_id": user_id, "friend_id": friend_id})
+
+
+def _on_friendship_event(message: dict):
+    if message.get("type") == "added":
+        friend_graph.add_edge(message["user_id"], message["friend_id"])
+    else:
+        friend_graph.invalidate(message.get("user_id"), message.get("friend_id"))
+
+pubsub.subscribe(FRIENDSHIPS_CHANNEL, _on_friendship_event)
@@ -0,0 +1,70 @@
+"""bcrypt hashing in a process pool.
+
+bcrypt is deliberately slow CPU work, so it runs in worker processes where it
+neither blocks the event loop nor competes for the GIL with request handling.
+Workers are started with "spawn" rather than forked from the running,
+multi-threaded server, so they begin clean and only import this module, which
+must stay free of app/DB imports.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Hashes below BCRYPT_ROUNDS are flagged for upgrade on the next login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
+
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def hash_password_sync(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_and_update_sync(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), hash_password_sync, password)
+
+
+async def verify_and_update_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Check a password, returning (valid, new_hash).
+
+    new_hash is set when the stored hash uses outdated parameters and should be
+    replaced.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), verify_and_update_sync, password, hashed_password)
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    valid, _ = await verify_and_update_password(password, hashed_password)
+    return valid
@@ -0,0 +1,133 @@
+"""Write-behind likes_count, enabled with LIKE_COUNTER_WRITE_BEHIND.
+
+Like rows are still written by the request, but the change to
+posts.likes_count is added to a per-post delta here instead of updating the
+posts row, so likes on a viral post stop serializing on that row's lock.
+A background task applies the summed deltas in one UPDATE every
+LIKE_COUNTER_FLUSH_MS milliseconds.
+
+Counts served by this worker are the persisted value plus its own pending
+delta; other workers catch up after the next flush. Deltas not yet flushed
+are lost if the process dies. The likes table stays authoritative: after an
+unclean shutdown, before starting workers again (a recount while any worker
+holds pending deltas would count those likes twice), run
+
+    python -m app.core.like_counter
+"""
+import asyncio
+import logging
+import os
+import threading
+from sqlalchemy import select, update, values, column, Integer, func
+from app.db.models.like import Like
+from app.db.models.post import Post
+from app.db.session import AsyncSessionLocal, SessionLocal
+
+ENABLED = os.getenv("LIKE_COUNTER_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+FLUSH_MS = float(os.getenv("LIKE_COUNTER_FLUSH_MS", "1000"))
+
+
+def apply_deltas_statement(deltas: dict):
+    """Add each post's delta to its likes_count in one UPDATE ... FROM (VALUES ...)."""
+    rows = values(column("post_id", Integer), column("delta", Integer), name="deltas")\
+        .data(sorted(deltas.items()))
+    return update(Post)\
+        .where(Post.id == rows.c.post_id)\
+        .values(likes_count=func.coalesce(Post.likes_count, 0) + rows.c.delta)\
+        .execution_options(synchronize_session=False)
+
+
+def recount_statement():
+    """Set every post's likes_count from its like rows, touching only posts that drifted."""
+    actual = select(func.count()).where(Like.post_id == Post.id).scalar_subquery()
+    return update(Post)\
+        .where(Post.likes_count.is_distinct_from(actual))\
+        .values(likes_count=actual)\
+        .execution_options(synchronize_session=False)
+
+
+def recount() -> int:
+    db = SessionLocal()
+    try:
+        updated = db.execute(recount_statement()).rowcount
+        db.commit()
+        return updated
+    finally:
+        db.close()
+
+
+class LikeCounter:
+    def __init__(self, flush_ms: float):
+        self.flush_ms = flush_ms
+        self._lock = threading.Lock()  # toggles run in threadpool workers
+        self._deltas = {}  # post_id -> pending change to likes_count
+        self._stopping = None
+        self._task = None
+
+    def add(self, post_id: int, delta: int):
+        if not delta:
+            return
+        with self._lock:
+            self._add(post_id, delta)
+
+    def _add(self, post_id: int, delta: int):
+        total = self._deltas.get(post_id, 0) + delta
+        if total:
+            self._deltas[post_id] = total
+        else:
+            self._deltas.pop(post_id, None)
+
+    def pending(self, post_id: int) -> int:
+        return self._deltas.get(post_id, 0)
+
+    def count(self, post: Post) -> int:
+        """The post's likes_count as persisted plus what hasn't been flushed."""
+        return (post.likes_count or 0) + self.pending(post.id)
+
+    def __len__(self):
+        return len(self._deltas)
+
+    def start(self):
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Let a flush in progress finish instead of cancelling it mid-commit
+        if self._task:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.flush_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self):
+        # Deltas stay pending until committed, then only what was written is
+        # taken off, so likes added meanwhile or a cancelled flush lose nothing
+        with self._lock:
+            deltas = dict(self._deltas)
+        if not deltas:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(apply_deltas_statement(deltas))
+                await db.commit()
+        except Exception:
+            logging.exception(f"like counter flush of {len(deltas)} posts failed")
+            return
+        with self._lock:
+            for post_id, delta in deltas.items():
+                self._add(post_id, -delta)
+
+
+counter = LikeCounter(FLUSH_MS)
+
+
+if __name__ == "__main__":
+    print(f"recounted {recount()} posts")
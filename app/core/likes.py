@@ -0,0 +1,52 @@
+from sqlalchemy import select, delete, update, func, exists, literal
+from sqlalchemy.dialects.postgresql import insert
+from app.db.models.like import Like
+from app.db.models.post import Post
+
+
+def _like_changes(user_id: int, post_id: int) -> tuple:
+    # Deletes the user's like if there is one, otherwise inserts it (the
+    # unique (user_id, post_id) constraint absorbs concurrent duplicates).
+    # Returns scalar counts of the rows added and removed.
+    removed = delete(Like)\
+        .where(Like.user_id == user_id, Like.post_id == post_id)\
+        .returning(Like.post_id)\
+        .cte("removed")
+    added = insert(Like).from_select(
+        ["user_id", "post_id"],
+        select(literal(user_id), Post.id).where(
+            Post.id == post_id,
+            ~exists().select_from(removed),
+        ),
+    ).on_conflict_do_nothing(constraint="uq_likes_user_post")\
+        .returning(Like.post_id)\
+        .cte("added")
+
+    added_count = select(func.count()).select_from(added).scalar_subquery()
+    removed_count = select(func.count()).select_from(removed).scalar_subquery()
+    return added_count, removed_count
+
+
+def toggle_like_statement(user_id: int, post_id: int):
+    """Like or unlike a post in one statement.
+
+    Moves likes_count by the like rows actually changed. Returns the updated
+    post and whether it is now liked (nothing removed means the like exists,
+    whether this call or a concurrent one inserted it); no row means the
+    post doesn't exist.
+    """
+    added_count, removed_count = _like_changes(user_id, post_id)
+    return update(Post)\
+        .where(Post.id == post_id)\
+        .values(likes_count=func.coalesce(Post.likes_count, 0) + added_count - removed_count)\
+        .returning(Post, (removed_count == 0).label("liked"))\
+        .execution_options(synchronize_session=False)
+
+
+def toggle_like_rows_statement(user_id: int, post_id: int):
+    """Like toggle_like_statement, but leaves likes_count alone and returns
+    the post with the count change (-1, 0 or 1) for a write-behind counter.
+    The posts row is only read, so likes on a hot post don't queue on its lock."""
+    added_count, removed_count = _like_changes(user_id, post_id)
+    return select(Post, (removed_count == 0).label("liked"), (added_count - removed_count).label("delta"))\
+        .where(Post.id == post_id)
@@ -0,0 +1,134 @@
+"""Cloudinary calls in a bounded thread pool.
+
+The Cloudinary SDK is blocking network I/O, so uploads and deletes run in
+MEDIA_UPLOAD_WORKERS threads instead of on the event loop. Post images are
+uploaded after the post is created: the post starts with image_status
+"pending" and is filled in (or marked "failed") when the upload finishes.
+Deletes are fire-and-forget, scheduled as request background tasks.
+Images left pending, e.g. by a worker that stopped mid-upload, are marked
+failed by a periodic sweep after MEDIA_PENDING_TIMEOUT_MINUTES.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional
+from cloudinary import uploader
+from sqlalchemy import update
+from app.db.models.post import Post
+from app.db.session import AsyncSessionLocal
+
+UPLOAD_WORKERS = int(os.getenv("MEDIA_UPLOAD_WORKERS", "8"))
+# Post images still pending after this long are marked failed by the sweep
+PENDING_TIMEOUT_MINUTES = float(os.getenv("MEDIA_PENDING_TIMEOUT_MINUTES", "15"))
+SWEEP_SECONDS = 60
+
+IMAGE_PENDING = "pending"
+IMAGE_READY = "ready"
+IMAGE_FAILED = "failed"
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="media")
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def upload(data: bytes, **options) -> dict:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), partial(uploader.upload, data, **options))
+
+
+async def destroy(public_id: str):
+    """Delete an image, logging rather than raising on failure (cleanup only)."""
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(get_executor(), uploader.destroy, public_id)
+    except Exception as e:
+        logging.error(f"Cloudinary delete error: {str(e)}")
+
+
+async def attach_post_image(post_id: int, data: bytes, public_id: str):
+    """Upload a pending post's image and record the result on the post.
+
+    Any failure ends in "failed" rather than leaving the post pending; if even
+    that can't be written, expire_pending_images picks the post up later.
+    """
+    uploaded_id = None
+    try:
+        upload_result = await upload(
+            data,
+            folder="post_images",
+            public_id=public_id,
+            resource_type="image",
+            overwrite=True,
+            quality="auto:good"
+        )
+        values = {
+            "image_url": upload_result["secure_url"],
+            "image_public_id": upload_result["public_id"],
+            "image_status": IMAGE_READY
+        }
+        uploaded_id = values["image_public_id"]
+    except Exception:
+        logging.exception(f"Image upload for post {post_id} failed")
+        values = {"image_status": IMAGE_FAILED}
+
+    try:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(Post)
+                .where(Post.id == post_id, Post.image_status == IMAGE_PENDING)
+                .values(**values)
+            )
+            await db.commit()
+        recorded = result.rowcount > 0
+    except Exception:
+        logging.exception(f"Could not record the image of post {post_id}")
+        recorded = False
+
+    # The post was deleted while uploading, or the result couldn't be saved
+    if uploaded_id and not recorded:
+        await destroy(uploaded_id)
+
+
+def expire_pending_statement(timeout_minutes: float = PENDING_TIMEOUT_MINUTES):
+    """Mark images still pending after timeout_minutes as failed, e.g. when the
+    worker uploading them stopped."""
+    return update(Post)\
+        .where(
+            Post.image_status == IMAGE_PENDING,
+            Post.created_at < datetime.utcnow() - timedelta(minutes=timeout_minutes)
+        )\
+        .values(image_status=IMAGE_FAILED)\
+        .execution_options(synchronize_session=False)
+
+
+async def expire_pending_images() -> int:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(expire_pending_statement())
+        await db.commit()
+    return result.rowcount
+
+
+async def expire_pending_periodically(interval: float = SWEEP_SECONDS):
+    while True:
+        try:
+            expired = await expire_pending_images()
+            if expired:
+                logging.warning(f"{expired} post images stuck pending were marked failed")
+        except Exception:
+            logging.exception("pending image sweep failed")
+        await asyncio.sleep(interval)
@@ -0,0 +1,127 @@
+"""Push delivery of new notifications to connected websockets.
+
+Writers publish the recipient ids after committing; each notification socket
+subscribes to its user's channel and, when woken, sends the rows newer than
+the last one it delivered. Events carry no payload beyond the user id so any
+pub/sub backend (including Postgres NOTIFY) can transport them.
+
+Unread counts live in notification_counters. Whoever inserts notifications
+or flips is_read executes the matching statement below in the same
+transaction, so the counter stays exact without counting rows.
+"""
+import asyncio
+from collections import Counter
+from typing import Awaitable, Callable, Optional
+from sqlalchemy import select, update, case
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import joinedload
+from app.db.models.notifications import Notification, NotificationCounter
+from app.db.session import AsyncSessionLocal
+from app.core import pubsub
+
+BATCH_SIZE = 100
+
+
+def channel(user_id: int) -> str:
+    return f"notifications.{user_id}"
+
+
+# Call after the notifications are committed
+def publish_new(*user_ids: int):
+    for user_id in set(user_ids):
+        pubsub.publish(channel(user_id), {"user_id": user_id})
+
+
+# Counter maintenance
+
+def record_new_statement(user_ids):
+    """Add one unread notification per entry of user_ids (repeats allowed)."""
+    counts = Counter(user_ids)
+    statement = insert(NotificationCounter).values([
+        {"user_id": user_id, "unread_count": count} for user_id, count in sorted(counts.items())
+    ])
+    return statement.on_conflict_do_update(
+        index_elements=[NotificationCounter.user_id],
+        set_={"unread_count": NotificationCounter.unread_count + statement.excluded.unread_count},
+    )
+
+
+def mark_read_statement(user_id: int, up_to_id: Optional[int] = None, notification_id: Optional[int] = None):
+    """Flag the user's unread notifications as read in one UPDATE: a single
+    one, everything up to up_to_id, or all of them."""
+    statement = update(Notification).where(
+        Notification.user_id == user_id,
+        Notification.is_read == False
+    )
+    if notification_id is not None:
+        statement = statement.where(Notification.id == notification_id)
+    if up_to_id is not None:
+        statement = statement.where(Notification.id <= up_to_id)
+    return statement.values(is_read=True)
+
+
+def decrement_unread_statement(user_id: int, count: int):
+    """Take count off the user's unread counter, never below zero."""
+    current = NotificationCounter.unread_count
+    return update(NotificationCounter)\
+        .where(NotificationCounter.user_id == user_id)\
+        .values(unread_count=case((current > count, current - count), else_=0))
+
+
+class Wakeup:
+    """An asyncio.Event set whenever the user's channel fires.
+
+    Publishers may run in threadpool workers, so the event is set through
+    the loop that created the subscription.
+    """
+
+    def __init__(self, user_id: int):
+        self.channel = channel(user_id)
+        self.event = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+
+    def _handler(self, message: dict):
+        self._loop.call_soon_threadsafe(self.event.set)
+
+    def __enter__(self):
+        pubsub.subscribe(self.channel, self._handler)
+        return self
+
+    def __exit__(self, *exc_info):
+        pubsub.unsubscribe(self.channel, self._handler)
+
+
+def serialize(notification: Notification) -> dict:
+    return {
+        "id": notification.id,
+        "message": notification.message,
+        "type": notification.type,
+        "created_at": notification.created_at.isoformat(),
+        "related_user": {
+            "id": notification.related_user.id,
+            "email": notification.related_user.email
+        } if notification.related_user else None
+    }
+
+
+async def push_new(send: Callable[[list], Awaitable], user_id: int, last_seen_id: Optional[int]) -> Optional[int]:
+    """Send notifications after last_seen_id (all unread ones when None) in
+    batches, oldest first, and return the new last id."""
+    while True:
+        query = select(Notification).options(joinedload(Notification.related_user))\
+            .filter(Notification.user_id == user_id)
+        if last_seen_id is None:
+            query = query.filter(Notification.is_read == False)
+        else:
+            query = query.filter(Notification.id > last_seen_id)
+        # A short session per batch, sockets hold no connection while idle
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(query.order_by(Notification.id).limit(BATCH_SIZE))
+            batch = result.scalars().all()
+        if not batch:
+            return last_seen_id
+
+        await send([serialize(n) for n in batch])
+        last_seen_id = batch[-1].id
+        if len(batch) < BATCH_SIZE:
+            return last_seen_id
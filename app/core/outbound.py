@@ -0,0 +1,100 @@
+"""Bounded per-connection send queues for websockets.
+
+Each socket gets a queue drained by its own writer task, so a slow or dead
+client only backs up its own queue. Producers never await the network:
+when a queue is full the client is treated as a slow consumer and its
+socket is closed so it can reconnect and catch up from history.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import weakref
+from fastapi import WebSocket
+
+SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+# Close code for dropped slow consumers, "Try Again Later"
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+def dumps(message) -> str:
+    # Same encoding as WebSocket.send_json
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+class OutboundStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.slow_consumers_dropped = 0
+
+    def record_drop(self):
+        with self._lock:
+            self.slow_consumers_dropped += 1
+
+outbound_stats = OutboundStats()
+_queues = weakref.WeakSet()
+
+
+class OutboundQueue:
+    def __init__(self, websocket: WebSocket, max_size: int = SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.closed = False
+        self._queue = asyncio.Queue(max_size)
+        self._writer = asyncio.create_task(self._drain())
+        _queues.add(self)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def send_text(self, text: str) -> bool:
+        """Queue an already serialized message, False if the client was dropped."""
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(text)
+        except asyncio.QueueFull:
+            outbound_stats.record_drop()
+            logging.warning("dropping slow websocket consumer")
+            self.close(SLOW_CONSUMER_CLOSE_CODE)
+            return False
+        return True
+
+    def send_json(self, message) -> bool:
+        return self.send_text(dumps(message))
+
+    def close(self, code: int = 1000):
+        if self.closed:
+            return
+        self.closed = True
+        self._writer.cancel()
+        asyncio.create_task(self._close(code))
+
+    async def _close(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass  # already closed by the client
+
+    async def _drain(self):
+        try:
+            while True:
+                text = await self._queue.get()
+                await self.websocket.send_text(text)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Socket is gone; the receive loop sees the disconnect and cleans up
+            self.closed = True
+
+
+def get_queue_status() -> dict:
+    depths = [queue.depth for queue in list(_queues) if not queue.closed]
+    return {
+        "connections": len(depths),
+        "queued_messages": sum(depths),
+        "max_depth": max(depths, default=0),
+        "queue_size": SEND_QUEUE_SIZE,
+        "slow_consumers_dropped": outbound_stats.slow_consumers_dropped,
+    }
@@ -0,0 +1,90 @@
+import base64
+import json
+from datetime import datetime
+from typing import Callable, Optional
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+
+def encode_cursor(**values) -> str:
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def _cursor_id(value) -> Optional[int]:
+    if value is not None and (isinstance(value, bool) or not isinstance(value, int)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value
+
+
+# Id-keyset pagination for message histories, newest first.
+# fetch_older(before_id, limit) returns rows with id < before_id (all rows
+# when before_id is None) in descending id order; fetch_newer(after_id, limit)
+# returns rows with id > after_id in ascending order.
+def id_keyset_page(
+    fetch_older: Callable,
+    fetch_newer: Callable,
+    page_size: int,
+    cursor: Optional[str] = None,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    around_id: Optional[int] = None,
+) -> dict:
+    if cursor:
+        values = decode_cursor(cursor)
+        before_id, after_id = _cursor_id(values.get("before_id")), _cursor_id(values.get("after_id"))
+        if before_id is None and after_id is None:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if around_id is not None:
+        # The target message plus half a page on either side
+        older = fetch_older(around_id + 1, page_size // 2 + 2)
+        has_older = len(older) > page_size // 2 + 1
+        older = older[:page_size // 2 + 1]
+        newer_size = page_size - len(older)
+        newer = fetch_newer(around_id, newer_size + 1)
+        has_newer = len(newer) > newer_size
+        items = list(reversed(newer[:newer_size])) + older
+    elif after_id is not None:
+        newer = fetch_newer(after_id, page_size + 1)
+        has_newer = len(newer) > page_size
+        items = list(reversed(newer[:page_size]))
+        # Everything at or below after_id is older than this page
+        has_older = bool(fetch_older(after_id + 1, 1))
+    else:
+        older = fetch_older(before_id, page_size + 1)
+        has_older = len(older) > page_size
+        items = older[:page_size]
+        has_newer = before_id is not None
+
+    return {
+        "items": items,
+        "next_cursor": encode_cursor(before_id=items[-1].id) if items and has_older else None,
+        "prev_cursor": encode_cursor(after_id=items[0].id) if items and has_newer else None,
+    }
+
+
+# (created_at, id) keyset for feeds ordered newest first
+def created_at_cursor(row) -> str:
+    return encode_cursor(created_at=row.created_at.isoformat(), id=row.id)
+
+
+def created_at_before(cursor: str, created_at_column, id_column):
+    values = decode_cursor(cursor)
+    try:
+        created_at = datetime.fromisoformat(values["created_at"])
+        row_id = int(values["id"])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return tuple_(created_at_column, id_column) < (created_at, row_id)
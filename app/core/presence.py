@@ -0,0 +1,129 @@
+"""Online/away presence kept in memory, shared between workers via pub/sub.
+
+Each worker counts its own sockets per user and publishes the user's state
+when it changes, and again at least every REFRESH seconds while heartbeats
+keep arriving. Every worker folds those events into an index of
+user_id -> {worker: (state, received_at)}; entries not refreshed within TTL
+count as offline, so a crashed worker's users fade out on their own.
+"""
+import os
+import socket
+import threading
+import time
+from app.core import pubsub
+
+PRESENCE_CHANNEL = "presence"
+# Seconds without a refresh before a user counts as offline; clients should
+# heartbeat well inside this
+TTL = float(os.getenv("PRESENCE_TTL", "90"))
+REFRESH = TTL / 3
+MAX_BULK_IDS = 500
+STATES = ("online", "away")
+OFFLINE = "offline"
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class PresenceIndex:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}  # user_id -> {worker_id: (state, received_at)}
+        self._last_prune = time.monotonic()
+
+    def apply(self, user_id: int, worker_id: str, state: str):
+        now = time.monotonic()
+        with self._lock:
+            if state == OFFLINE:
+                workers = self._entries.get(user_id)
+                if workers is not None:
+                    workers.pop(worker_id, None)
+                    if not workers:
+                        del self._entries[user_id]
+            else:
+                self._entries.setdefault(user_id, {})[worker_id] = (state, now)
+            if now - self._last_prune > self.ttl:
+                self._prune(now)
+
+    def state(self, user_id: int) -> str:
+        now = time.monotonic()
+        with self._lock:
+            workers = self._entries.get(user_id)
+            if not workers:
+                return OFFLINE
+            live = [state for state, received_at in workers.values() if now - received_at <= self.ttl]
+        if "online" in live:
+            return "online"
+        return "away" if live else OFFLINE
+
+    def states(self, user_ids) -> dict:
+        return {user_id: self.state(user_id) for user_id in user_ids}
+
+    def _prune(self, now: float):
+        for user_id in list(self._entries):
+            workers = self._entries[user_id]
+            for worker_id, (_, received_at) in list(workers.items()):
+                if now - received_at > self.ttl:
+                    del workers[worker_id]
+            if not workers:
+                del self._entries[user_id]
+        self._last_prune = now
+
+
+class LocalPresence:
+    """Sockets and last reported state per user in this worker."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = {}  # user_id -> [connections, state, published_at]
+
+    def connected(self, user_id: int):
+        with self._lock:
+            entry = self._users.setdefault(user_id, [0, "online", 0.0])
+            entry[0] += 1
+        self.heartbeat(user_id, "online")
+
+    def disconnected(self, user_id: int):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return
+            entry[0] -= 1
+            if entry[0] > 0:
+                return
+            del self._users[user_id]
+        _publish(user_id, OFFLINE)
+
+    def heartbeat(self, user_id: int, state: str = "online"):
+        if state not in STATES:
+            state = "online"
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return
+            if entry[1] == state and now - entry[2] < REFRESH:
+                return
+            entry[1], entry[2] = state, now
+        _publish(user_id, state)
+
+
+def _publish(user_id: int, state: str):
+    pubsub.publish(PRESENCE_CHANNEL, {"user_id": user_id, "worker": WORKER_ID, "state": state})
+
+
+def _on_presence_event(message: dict):
+    presence_index.apply(message["user_id"], message["worker"], message["state"])
+
+
+def friend_states(user_ids, friend_ids) -> dict:
+    """State of each requested id that is a friend, others are left out."""
+    return {user_id: presence_index.state(user_id) for user_id in user_ids if user_id in friend_ids}
+
+
+presence_index = PresenceIndex(TTL)
+local_presence = LocalPresence()
+pubsub.subscribe(PRESENCE_CHANNEL, _on_presence_event)
+
+connected = local_presence.connected
+disconnected = local_presence.disconnected
+heartbeat = local_presence.heartbeat
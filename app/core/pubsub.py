@@ -0,0 +1,201 @@
+"""Publish/subscribe between the parts of the app that keep in-process state.
+
+Caches and indexes subscribe to a channel and apply the events published on
+it, so the code that changes the database doesn't need to know who holds
+derived state. InMemoryPubSub only reaches subscribers in this process;
+PostgresPubSub fans out to every worker through LISTEN/NOTIFY and is enabled
+with PUBSUB_BACKEND=postgres.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Callable, Optional
+
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "memory")
+
+
+class PubSub(ABC):
+    @abstractmethod
+    def publish(self, channel: str, message: dict):
+        ...
+
+    @abstractmethod
+    def subscribe(self, channel: str, handler: Callable[[dict], None]):
+        ...
+
+    @abstractmethod
+    def unsubscribe(self, channel: str, handler: Callable[[dict], None]):
+        ...
+
+
+class InMemoryPubSub(PubSub):
+    """Delivers messages synchronously to handlers in the publishing process.
+
+    Handlers run on the publishing thread, which may be a threadpool
+    worker; ones that touch asyncio objects hop to their loop first.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handlers = defaultdict(list)
+
+    def publish(self, channel: str, message: dict):
+        with self._lock:
+            handlers = list(self._handlers.get(channel, ()))
+        for handler in handlers:
+            try:
+                handler(message)
+            except Exception:
+                logging.exception(f"pubsub handler failed on channel {channel}")
+
+    def subscribe(self, channel: str, handler: Callable[[dict], None]):
+        with self._lock:
+            self._handlers[channel].append(handler)
+
+    def unsubscribe(self, channel: str, handler: Callable[[dict], None]):
+        with self._lock:
+            handlers = self._handlers.get(channel)
+            if handlers and handler in handlers:
+                handlers.remove(handler)
+                if not handlers:
+                    del self._handlers[channel]
+
+
+class PostgresPubSub(PubSub):
+    """Fans messages out to every process listening on one Postgres channel.
+
+    All app channels share a single NOTIFY channel; each process dispatches
+    what it receives to its local subscribers, including its own messages,
+    so delivery order is the same everywhere. Payloads larger than NOTIFY
+    allows are split into parts and reassembled by the listeners.
+    """
+
+    PG_CHANNEL = "app_pubsub"
+    # NOTIFY payloads must stay under 8000 bytes
+    MAX_PART = 7000
+    RECONNECT_SECONDS = 1
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.local = InMemoryPubSub()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._outbox: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ids = itertools.count()
+        self._parts = {}  # (sender pid, message id) -> list of parts
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._outbox = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+
+    def publish(self, channel: str, message: dict):
+        # May be called from threadpool workers, sends happen on the loop
+        if self._loop is None:
+            raise RuntimeError("PostgresPubSub.publish called before start()")
+        raw = json.dumps({"c": channel, "m": message}, separators=(",", ":"))
+        message_id = next(self._ids)
+        parts = [raw[i:i + self.MAX_PART] for i in range(0, len(raw), self.MAX_PART)]
+        for index, part in enumerate(parts):
+            header = f"{message_id}:{index}:{len(parts)}:"
+            self._loop.call_soon_threadsafe(self._outbox.put_nowait, header + part)
+
+    def subscribe(self, channel: str, handler: Callable[[dict], None]):
+        self.local.subscribe(channel, handler)
+
+    def unsubscribe(self, channel: str, handler: Callable[[dict], None]):
+        self.local.unsubscribe(channel, handler)
+
+    def _on_notify(self, connection, pid: int, pg_channel: str, payload: str):
+        message_id, index, total, part = payload.split(":", 3)
+        key = (pid, message_id)
+        if total != "1":
+            parts = self._parts.setdefault(key, [])
+            parts.append(part)
+            if len(parts) < int(total):
+                return
+            part = "".join(self._parts.pop(key))
+        try:
+            envelope = json.loads(part)
+        except ValueError:
+            logging.exception("pubsub dropped a malformed notification")
+            return
+        self.local.publish(envelope["c"], envelope["m"])
+
+    async def _run(self):
+        import asyncpg
+
+        while True:
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                try:
+                    await connection.add_listener(self.PG_CHANNEL, self._on_notify)
+                    while True:
+                        payload = await self._outbox.get()
+                        await connection.execute("SELECT pg_notify($1, $2)", self.PG_CHANNEL, payload)
+                finally:
+                    self._parts.clear()
+                    await connection.close()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Messages published while disconnected are lost, like any NOTIFY
+                logging.exception("pubsub connection lost, reconnecting")
+                await asyncio.sleep(self.RECONNECT_SECONDS)
+
+
+bus: PubSub = InMemoryPubSub()
+_subscriptions = defaultdict(list)  # channel -> handlers, replayed by set_backend
+
+
+def set_backend(backend: PubSub):
+    """Swap the transport, carrying over existing subscriptions."""
+    global bus
+    for channel, handlers in _subscriptions.items():
+        for handler in handlers:
+            bus.unsubscribe(channel, handler)
+            backend.subscribe(channel, handler)
+    bus = backend
+
+
+def publish(channel: str, message: dict):
+    bus.publish(channel, message)
+
+
+def subscribe(channel: str, handler: Callable[[dict], None]):
+    _subscriptions[channel].append(handler)
+    bus.subscribe(channel, handler)
+
+
+def unsubscribe(channel: str, handler: Callable[[dict], None]):
+    handlers = _subscriptions.get(channel)
+    if handlers and handler in handlers:
+        handlers.remove(handler)
+        if not handlers:
+            del _subscriptions[channel]
+    bus.unsubscribe(channel, handler)
+
+async def start():
+    """Switch to the configured cross-worker backend, call once per process."""
+    if PUBSUB_BACKEND == "postgres":
+        from app.db.session import SQLALCHEMY_DATABASE_URL
+
+        backend = PostgresPubSub(SQLALCHEMY_DATABASE_URL)
+        await backend.start()
+        set_backend(backend)
+    elif PUBSUB_BACKEND != "memory":
+        raise ValueError(f"Unknown PUBSUB_BACKEND {PUBSUB_BACKEND!r}")
+
+
+async def stop():
+    if isinstance(bus, PostgresPubSub):
+        await bus.close()
@@ -0,0 +1,102 @@
+"""Registry of multiplexed /ws connections in this worker.
+
+Connections are indexed by user and by pub/sub channel. The registry holds
+one pub/sub subscription per channel with local subscribers and hands each
+event, on the event loop, to that channel's deliver function together with
+the subscribed connections.
+"""
+import asyncio
+from functools import partial
+from typing import Callable, Optional
+from app.core import pubsub
+from app.core.outbound import OutboundQueue
+
+
+class Connection:
+    # Kept small, a worker may hold tens of thousands of these
+    __slots__ = ("user", "outbound", "channels", "tasks", "wakeup", "__weakref__")
+
+    def __init__(self, user, outbound: OutboundQueue):
+        self.user = user
+        self.outbound = outbound
+        self.channels = {}  # pub/sub channel -> client channel name
+        self.tasks = None  # client channel -> background task, created on demand
+        self.wakeup = None  # asyncio.Event for the notifications channel
+
+    @property
+    def user_id(self) -> int:
+        return self.user.id
+
+    def start_task(self, name: str, coroutine):
+        if self.tasks is None:
+            self.tasks = {}
+        self.tasks[name] = asyncio.create_task(coroutine)
+
+    def stop_task(self, name: str):
+        if self.tasks and name in self.tasks:
+            self.tasks.pop(name).cancel()
+
+
+class ConnectionRegistry:
+    def __init__(self):
+        self.by_user = {}  # user_id -> set of Connection
+        self.by_channel = {}  # pub/sub channel -> set of Connection
+        self._handlers = {}  # pub/sub channel -> handler registered with pubsub
+
+    def add(self, connection: Connection):
+        self.by_user.setdefault(connection.user_id, set()).add(connection)
+
+    def remove(self, connection: Connection):
+        for channel in list(connection.channels):
+            self.unsubscribe(connection, channel)
+        for name in list(connection.tasks or ()):
+            connection.stop_task(name)
+        connections = self.by_user.get(connection.user_id)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self.by_user[connection.user_id]
+        connection.outbound.close()
+
+    def connections_for(self, user_id: int) -> set:
+        return self.by_user.get(user_id, set())
+
+    def subscribe(self, connection: Connection, channel: str, name: str, deliver: Callable):
+        """deliver(event, connections) is called for each event on the channel."""
+        connection.channels[channel] = name
+        subscribers = self.by_channel.get(channel)
+        if subscribers is None:
+            subscribers = self.by_channel[channel] = set()
+            handler = self._handlers[channel] = partial(
+                self._on_event, asyncio.get_running_loop(), channel, deliver
+            )
+            pubsub.subscribe(channel, handler)
+        subscribers.add(connection)
+
+    def unsubscribe(self, connection: Connection, channel: str) -> Optional[str]:
+        name = connection.channels.pop(channel, None)
+        subscribers = self.by_channel.get(channel)
+        if subscribers is not None:
+            subscribers.discard(connection)
+            if not subscribers:
+                del self.by_channel[channel]
+                pubsub.unsubscribe(channel, self._handlers.pop(channel))
+        return name
+
+    def _on_event(self, loop: asyncio.AbstractEventLoop, channel: str, deliver: Callable, event: dict):
+        # Publishers may run in threadpool workers, connections are served from the loop
+        loop.call_soon_threadsafe(self._dispatch, channel, deliver, event)
+
+    def _dispatch(self, channel: str, deliver: Callable, event: dict):
+        subscribers = self.by_channel.get(channel)
+        if subscribers:
+            deliver(event, list(subscribers))
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self.by_user),
+            "connections": sum(len(c) for c in self.by_user.values()),
+            "channels": len(self.by_channel),
+        }
+
+registry = ConnectionRegistry()
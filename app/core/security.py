@@ -1,23 +1,103 @@
-from passlib.context import CryptContext
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
+from dataclasses import dataclass
 from typing import Optional
+import os
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from app.schemas.token import TokenData
-from app.db.session import get_db
+from app.db.session import SessionLocal
 from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.models.user import User
-from app.db.models.connection_request import ConnectionRequest  
+from app.db.models.user_info import UserInfo
+from app.core.cache import TTLCache
+from app.core import pubsub
+from app.core.friends import get_friend_ids, async_get_friend_ids
 
 SECRET_KEY = "supersecretkey"
 ALGORITHM = "HS256"
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user, as much as request handlers need of it."""
+    id: int
+    email: str
+    first_name: str
+    last_name: str
+    role: str
+    is_verified: bool
+
+
+# Principals by user id (or email for tokens issued before user_id claims).
+# Entries are dropped on role, verification or account changes, see
+# invalidate_principal, in every worker through the "principals" channel.
+principal_cache = TTLCache(
+    int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000")),
+    float(os.getenv("PRINCIPAL_CACHE_TTL", "300")),
+)
+
+PRINCIPALS_CHANNEL = "principals"
+
+# Call after the change is committed
+def invalidate_principal(user_id: int, email: Optional[str] = None):
+    # Evict here straight away, other workers evict when the event arrives
+    principal_cache.invalidate(user_id, email)
+    pubsub.publish(PRINCIPALS_CHANNEL, {"user_id": user_id, "email": email})
+
+def _on_principal_event(message: dict):
+    principal_cache.invalidate(message["user_id"], message.get("email"))
+
+pubsub.subscribe(PRINCIPALS_CHANNEL, _on_principal_event)
+
+def _principal_key(token_data: TokenData):
+    return token_data.user_id if token_data.user_id is not None else token_data.email
+
+def _principal_query(token_data: TokenData):
+    query = select(User, UserInfo.is_verified).outerjoin(UserInfo, UserInfo.user_id == User.id)
+    if token_data.user_id is not None:
+        return query.filter(User.id == token_data.user_id)
+    return query.filter(User.email == token_data.email)
+
+def _to_principal(row) -> Optional[Principal]:
+    if row is None:
+        return None
+    user, is_verified = row
+    return Principal(
+        id=user.id,
+        email=user.email,
+        first_name=user.first_name,
+        last_name=user.last_name,
+        role=user.role,
+        is_verified=bool(is_verified),
+    )
+
+def load_principal(token_data: TokenData) -> Optional[Principal]:
+    key = _principal_key(token_data)
+    principal = principal_cache.get(key)
+    if principal is None:
+        # Short-lived session, only opened on a cache miss
+        with SessionLocal() as db:
+            principal = _to_principal(db.execute(_principal_query(token_data)).first())
+        if principal is not None:
+            principal_cache.set(key, principal)
+    return principal
+
+async def async_load_principal(token_data: TokenData, db: AsyncSession) -> Optional[Principal]:
+    key = _principal_key(token_data)
+    principal = principal_cache.get(key)
+    if principal is None:
+        principal = _to_principal((await db.execute(_principal_query(token_data))).first())
+        if principal is not None:
+            principal_cache.set(key, principal)
+    return principal
+
+
+def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -25,13 +105,13 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     )
 
     token_data = verify_token(token, credentials_exception)
-    user = db.query(User).filter(User.email == token_data.email).first()
+    user = load_principal(token_data)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 
-def get_current_admin(current_user: User = Depends(get_current_user)):
+def get_current_admin(current_user: Principal = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -39,23 +119,22 @@ def get_current_admin(current_user: User = Depends(get_current_user)):
         )
     return current_user
 
-def hash_password(password: str):
-    return pwd_context.hash(password)
-
 def verify_token(token: str, credentials_exception):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
-        return TokenData(email=email)
+        return TokenData(
+            email=email,
+            user_id=payload.get("user_id"),
+            role=payload.get("role"),
+            is_verified=payload.get("verified"),
+        )
     except JWTError:
         raise credentials_exception
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(days=30))
@@ -63,22 +142,17 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+# Friendship checks go through the in-memory graph, one query per user on a miss
 def are_friends(db:Session ,user_id: int, friend_id: int) -> bool:
-    return db.query(ConnectionRequest).filter(
-        ((ConnectionRequest.sender_id == user_id) & (ConnectionRequest.receiver_id == friend_id)) |
-        ((ConnectionRequest.sender_id == friend_id) & (ConnectionRequest.receiver_id == user_id)),
-        (ConnectionRequest.status == "accepted")  # ✅ Only if status = accepted
-    ).first() is not None
+    return friend_id in get_friend_ids(db, user_id)
+
+async def async_are_friends(db: AsyncSession, user_id: int, friend_id: int) -> bool:
+    return friend_id in await async_get_friend_ids(db, user_id)
    
 # Modify your get_current_user to handle WebSocket token
-async def get_websocket_user(token: str, db:Session):
+async def get_websocket_user(token: str, db: AsyncSession) -> Optional[Principal]:
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
+        token_data = verify_token(token, JWTError())
     except JWTError:
         return None
-    
-    user = db.query(User).filter(User.email == username).first()
-    return user
+    return await async_load_principal(token_data, db)
@@ -0,0 +1,105 @@
+"""Precomputed "people you may know" lists, ranked by mutual friends.
+
+The whole table is rebuilt from the accepted-connection graph in one
+statement, either periodically from the app (SUGGESTIONS_REFRESH_SECONDS)
+or from cron with `python -m app.core.suggestions`.
+"""
+import asyncio
+import logging
+import os
+from sqlalchemy import select, union, func, delete, exists, and_, literal
+from app.db.models.connection_request import ConnectionRequest
+from app.db.models.suggestion import UserSuggestion
+from app.db.models.user import User
+from app.db.session import SessionLocal
+
+# Suggestions kept per user
+PER_USER = int(os.getenv("SUGGESTIONS_PER_USER", "100"))
+# 0 disables the in-app refresh, e.g. when cron runs it instead
+REFRESH_SECONDS = float(os.getenv("SUGGESTIONS_REFRESH_SECONDS", "3600"))
+# Lets a single worker refresh at a time when several run the loop
+REFRESH_LOCK_ID = 7_001_013
+
+
+def connection_exists(user_id_column, other_id_column):
+    """Any request between the pair, whatever its status."""
+    return exists().where(
+        ConnectionRequest.sender_id == user_id_column, ConnectionRequest.receiver_id == other_id_column
+    ) | exists().where(
+        ConnectionRequest.sender_id == other_id_column, ConnectionRequest.receiver_id == user_id_column
+    )
+
+
+def ranked_suggestions_query(per_user: int):
+    accepted = ConnectionRequest.status == "accepted"
+    edges = union(
+        select(ConnectionRequest.sender_id.label("a"), ConnectionRequest.receiver_id.label("b")).filter(accepted),
+        select(ConnectionRequest.receiver_id.label("a"), ConnectionRequest.sender_id.label("b")).filter(accepted),
+    ).cte("friend_edges")
+    first, second = edges.alias("first_hop"), edges.alias("second_hop")
+
+    # Friends of friends, counted once per mutual friend
+    candidates = select(
+        first.c.a.label("user_id"),
+        second.c.b.label("suggested_user_id"),
+        func.count().label("mutual_count"),
+    ).join(second, second.c.a == first.c.b)\
+        .filter(second.c.b != first.c.a)\
+        .group_by(first.c.a, second.c.b)\
+        .subquery()
+
+    ranked = select(
+        candidates.c.user_id,
+        candidates.c.suggested_user_id,
+        candidates.c.mutual_count,
+        func.row_number().over(
+            partition_by=candidates.c.user_id,
+            order_by=(candidates.c.mutual_count.desc(), candidates.c.suggested_user_id),
+        ).label("rank"),
+    ).join(User, and_(User.id == candidates.c.suggested_user_id, User.role != "admin"))\
+        .filter(~connection_exists(candidates.c.user_id, candidates.c.suggested_user_id))\
+        .subquery()
+
+    return select(
+        ranked.c.user_id, ranked.c.suggested_user_id, ranked.c.mutual_count, ranked.c.rank, func.now()
+    ).filter(ranked.c.rank <= per_user)
+
+
+def refresh_suggestions(db, per_user: int = PER_USER) -> bool:
+    """Rebuild user_suggestions in one transaction.
+
+    Returns False without doing anything if another refresh holds the lock.
+    Readers keep seeing the previous lists until the commit.
+    """
+    if db.bind.dialect.name == "postgresql":
+        if not db.execute(select(func.pg_try_advisory_xact_lock(literal(REFRESH_LOCK_ID)))).scalar():
+            db.rollback()
+            return False
+    db.execute(delete(UserSuggestion))
+    db.execute(UserSuggestion.__table__.insert().from_select(
+        ["user_id", "suggested_user_id", "mutual_count", "rank", "computed_at"],
+        ranked_suggestions_query(per_user),
+    ))
+    db.commit()
+    return True
+
+
+def _refresh_once() -> bool:
+    db = SessionLocal()
+    try:
+        return refresh_suggestions(db)
+    finally:
+        db.close()
+
+
+async def refresh_periodically(interval: float = REFRESH_SECONDS):
+    while True:
+        try:
+            await asyncio.to_thread(_refresh_once)
+        except Exception:
+            logging.exception("suggestions refresh failed")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    print("refreshed" if _refresh_once() else "skipped, another refresh is running")
@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import select, union_all, func, literal, delete, exists
+from sqlalchemy.dialects.postgresql import insert
+from app.db.models.post import Post
+from app.db.models.timeline import TimelineEntry, TimelinePullAuthor
+from app.core.pagination import created_at_before
+from app.core.friends import friend_ids_query
+from app.core import pubsub
+
+# Authors with more friends than this are read at query time instead of fanned out
+FANOUT_LIMIT = int(os.getenv("TIMELINE_FANOUT_LIMIT", "5000"))
+# Recent posts copied into each side's timeline when a request is accepted
+BACKFILL_POSTS = int(os.getenv("TIMELINE_BACKFILL_POSTS", "100"))
+CACHE_USERS = int(os.getenv("TIMELINE_CACHE_USERS", "10000"))
+CACHE_DEPTH = int(os.getenv("TIMELINE_CACHE_DEPTH", "200"))
+CACHE_TTL = float(os.getenv("TIMELINE_CACHE_TTL", "30"))
+
+TIMELINE_CHANNEL = "timeline"
+
+
+class TimelineCache:
+    """LRU of the newest timeline entries per user, as (created_at, post_id)."""
+
+    def __init__(self, max_users: int, depth: int, ttl: float):
+        self.max_users = max_users
+        self.depth = depth
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id -> (loaded_at, entries, complete)
+
+    def get(self, user_id: int):
+        with self._lock:
+            cached = self._entries.get(user_id)
+            if cached is None or time.monotonic() - cached[0] > self.ttl:
+                return None
+            self._entries.move_to_end(user_id)
+            return cached[1], cached[2]
+
+    def set(self, user_id: int, entries: list, complete: bool):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic(), entries[:self.depth], complete)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def push(self, user_ids, entry: tuple):
+        with self._lock:
+            for user_id in user_ids:
+                cached = self._entries.get(user_id)
+                if cached is None:
+                    continue
+                loaded_at, entries, complete = cached
+                # Applied locally and again when the event comes back from pub/sub
+                if entry in entries:
+                    continue
+                entries = sorted(entries + [entry], reverse=True)
+                if len(entries) > self.depth:
+                    entries, complete = entries[:self.depth], False
+                self._entries[user_id] = (loaded_at, entries, complete)
+
+    def invalidate(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+timeline_cache = TimelineCache(CACHE_USERS, CACHE_DEPTH, CACHE_TTL)
+
+
+# Call after the change is committed. Applied here straight away, other
+# workers' caches apply it when the event arrives.
+def publish_post(user_ids, post: Post):
+    user_ids = list(user_ids)
+    timeline_cache.push(user_ids, (post.created_at, post.id))
+    pubsub.publish(TIMELINE_CHANNEL, {
+        "type": "push",
+        "user_ids": user_ids,
+        "created_at": post.created_at.isoformat(),
+        "post_id": post.id,
+    })
+
+
+def publish_invalidate(user_ids):
+    user_ids = list(user_ids)
+    timeline_cache.invalidate(user_ids)
+    pubsub.publish(TIMELINE_CHANNEL, {"type": "invalidate", "user_ids": user_ids})
+
+
+def _on_timeline_event(message: dict):
+    if message["type"] == "push":
+        entry = (datetime.fromisoformat(message["created_at"]), message["post_id"])
+        timeline_cache.push(message["user_ids"], entry)
+    else:
+        timeline_cache.invalidate(message["user_ids"])
+
+pubsub.subscribe(TIMELINE_CHANNEL, _on_timeline_event)
+
+
+def _entry_insert(rows):
+    return insert(TimelineEntry).from_select(
+        ["user_id", "post_id", "author_id", "created_at"], rows
+    ).on_conflict_do_nothing()
+
+
+def _post_values(post: Post):
+    return literal(post.id), literal(post.user_id), literal(post.created_at)
+
+
+# Write path
+
+async def fan_out_post(db, post: Post) -> list:
+    """Deliver a new post to its author and, for normal authors, all friends.
+
+    Returns the ids of the users whose timelines received the post. The post
+    must be flushed so it has an id and created_at.
+    """
+    friends = friend_ids_query(post.user_id).subquery()
+    degree = (await db.execute(select(func.count()).select_from(friends))).scalar()
+
+    recipients = select(literal(post.user_id), *_post_values(post))
+    if degree > FANOUT_LIMIT:
+        await db.execute(
+            insert(TimelinePullAuthor).values(author_id=post.user_id).on_conflict_do_nothing()
+        )
+    else:
+        recipients = union_all(recipients, select(friends.c.friend_id, *_post_values(post)))
+
+    result = await db.execute(_entry_insert(recipients).returning(TimelineEntry.user_id))
+    return result.scalars().all()
+
+
+async def backfill_friendship(db, user_id: int, friend_id: int):
+    """Copy each side's recent posts into the other's timeline."""
+    for reader_id, author_id in ((user_id, friend_id), (friend_id, user_id)):
+        recent = (
+            select(literal(reader_id), Post.id, Post.user_id, Post.created_at)
+            .filter(
+                Post.user_id == author_id,
+                ~exists().where(TimelinePullAuthor.author_id == author_id),
+            )
+            .order_by(Post.created_at.desc())
+            .limit(BACKFILL_POSTS)
+        )
+        await db.execute(_entry_insert(recent))
+
+
+def remove_post(db, post_id: int) -> list:
+    """Delete a post's timeline entries, returning the affected user ids."""
+    result = db.execute(
+        delete(TimelineEntry).where(TimelineEntry.post_id == post_id).returning(TimelineEntry.user_id)
+    )
+    return result.scalars().all()
+
+
+# Read path
+
+def _push_entries(db, user_id: int, cursor, limit: int) -> list:
+    if cursor is None:
+        cached = timeline_cache.get(user_id)
+        if cached and (cached[1] or len(cached[0]) >= limit):
+            return cached[0][:limit]
+
+    query = db.query(TimelineEntry.created_at, TimelineEntry.post_id)\
+        .filter(TimelineEntry.user_id == user_id)
+    if cursor:
+        query = query.filter(created_at_before(cursor, TimelineEntry.created_at, TimelineEntry.post_id))
+    entries = [tuple(row) for row in query
+        .order_by(TimelineEntry.created_at.desc(), TimelineEntry.post_id.desc())
+        .limit(max(limit, CACHE_DEPTH) if cursor is None else limit)
+        .all()]
+
+    if cursor is None:
+        timeline_cache.set(user_id, entries, complete=len(entries) < CACHE_DEPTH)
+    return entries[:limit]
+
+
+def _pull_entries(db, user_id: int, cursor, limit: int) -> list:
+    friends = friend_ids_query(user_id).subquery()
+    query = db.query(Post.created_at, Post.id)\
+        .join(TimelinePullAuthor, TimelinePullAuthor.author_id == Post.user_id)\
+        .filter(Post.user_id.in_(select(friends.c.friend_id)))
+    if cursor:
+        query = query.filter(created_at_before(cursor, Post.created_at, Post.id))
+    return [tuple(row) for row in query.order_by(Post.created_at.desc(), Post.id.desc()).limit(limit).all()]
+
+
+def read_timeline(db, user_id: int, cursor, limit: int) -> list:
+    """Newest-first (created_at, post_id) entries of a user's home timeline."""
+    entries = set(_push_entries(db, user_id, cursor, limit))
+    entries.update(_pull_entries(db, user_id, cursor, limit))
+    return sorted(entries, reverse=True)[:limit]
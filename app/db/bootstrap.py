@@ -0,0 +1,60 @@
+"""Explicit database bootstrap, run once per deploy instead of on import.
+
+    python -m app.db.bootstrap create-db   # create DB_NAME if missing
+    python -m app.db.bootstrap migrate     # alembic upgrade head
+    python -m app.db.bootstrap init        # both of the above
+"""
+import argparse
+import os
+import psycopg2
+from psycopg2 import sql
+from alembic import command
+from alembic.config import Config
+from dotenv import load_dotenv
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "alembic.ini")
+
+
+def create_database():
+    load_dotenv()
+    db_name = os.getenv("DB_NAME")
+    # Connect to the maintenance database, DB_NAME may not exist yet
+    conn = psycopg2.connect(
+        dbname="postgres",
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASS"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT"),
+        connect_timeout=5,
+    )
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (db_name,))
+            if cur.fetchone():
+                print(f"Database {db_name} already exists")
+                return
+            cur.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(db_name)))
+            print(f"Created database {db_name}")
+    finally:
+        conn.close()
+
+
+def migrate(revision: str = "head"):
+    command.upgrade(Config(os.path.normpath(ALEMBIC_INI)), revision)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Database bootstrap")
+    parser.add_argument("action", choices=["create-db", "migrate", "init"])
+    parser.add_argument("--revision", default="head")
+    args = parser.parse_args()
+
+    if args.action in ("create-db", "init"):
+        create_database()
+    if args.action in ("migrate", "init"):
+        migrate(args.revision)
+
+
+if __name__ == "__main__":
+    main()
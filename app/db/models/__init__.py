@@ -2,4 +2,11 @@ from app.db.base import Base
 from app.db.models.user import User
 from app.db.models.post import Post
 from app.db.models.like import Like
-from app.db.models.user_info import UserInfo
\ No newline at end of file
+from app.db.models.user_info import UserInfo
+from app.db.models.connection_request import ConnectionRequest
+from app.db.models.notifications import Notification, NotificationCounter
+from app.db.models.message import Message
+from app.db.models.group import Group, GroupMessage, GroupReadCursor, group_user_association
+from app.db.models.timeline import TimelineEntry, TimelinePullAuthor
+from app.db.models.conversation import Conversation
+from app.db.models.suggestion import UserSuggestion
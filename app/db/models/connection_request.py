@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 from sqlalchemy.sql import func
@@ -13,4 +13,9 @@ class ConnectionRequest(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     sender = relationship("User", foreign_keys=[sender_id])
-    receiver = relationship("User", foreign_keys=[receiver_id])
\ No newline at end of file
+    receiver = relationship("User", foreign_keys=[receiver_id])
+
+    __table_args__ = (
+        Index("ix_connection_requests_sender_receiver_status", "sender_id", "receiver_id", "status"),
+        Index("ix_connection_requests_receiver_status", "receiver_id", "status"),
+    )
\ No newline at end of file
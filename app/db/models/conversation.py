@@ -0,0 +1,28 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from app.db.base import Base
+
+
+class Conversation(Base):
+    """Denormalized summary of a direct-message thread, one row per user pair."""
+    __tablename__ = "conversations"
+
+    # Participants are stored in id order, user_low_id < user_high_id
+    user_low_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    user_high_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    last_message_id = Column(Integer, ForeignKey("messages.id", ondelete="SET NULL"), nullable=True)
+    last_sender_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    last_message_preview = Column(String(200), nullable=True)
+    last_message_at = Column(DateTime, nullable=True)
+    # Messages not yet read by each side
+    unread_low = Column(Integer, nullable=False, default=0)
+    unread_high = Column(Integer, nullable=False, default=0)
+    # Read watermarks, each side has read every message up to this id
+    read_low_id = Column(Integer, nullable=False, default=0)
+    read_high_id = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_conversations_low_last_message", "user_low_id", "last_message_id"),
+        Index("ix_conversations_high_last_message", "user_high_id", "last_message_id"),
+    )
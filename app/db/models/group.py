@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum, Table
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum, Table, Index
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 
@@ -11,6 +11,8 @@ group_user_association = Table(
     Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
     Column("role", Enum("member", "admin", name="group_roles"), default="member"),
     Column("joined_at", DateTime, default=datetime.utcnow),
+    # The primary key leads with group_id, "my groups" looks up by user_id
+    Index("ix_group_user_association_user_id", "user_id"),
 )
 
 class Group(Base):
@@ -36,3 +38,16 @@ class GroupMessage(Base):
 
     group = relationship("Group", back_populates="messages")
     sender = relationship("User")
+
+    __table_args__ = (
+        Index("ix_group_messages_group_id_id", "group_id", "id"),
+    )
+
+class GroupReadCursor(Base):
+    __tablename__ = "group_read_cursors"
+
+    group_id = Column(Integer, ForeignKey("groups.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    # Highest GroupMessage.id the member has read
+    last_read_message_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
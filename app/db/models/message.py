@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 
@@ -13,4 +13,10 @@ class Message(Base):
     is_read = Column(Boolean, default=False)
 
     sender = relationship("User", foreign_keys=[sender_id])
-    receiver = relationship("User", foreign_keys=[receiver_id])
\ No newline at end of file
+    receiver = relationship("User", foreign_keys=[receiver_id])
+
+    __table_args__ = (
+        # Conversation lookups in both directions, keyset-paginated by id
+        Index("ix_messages_sender_receiver_id", "sender_id", "receiver_id", "id"),
+        Index("ix_messages_receiver_sender_id", "receiver_id", "sender_id", "id"),
+    )
\ No newline at end of file
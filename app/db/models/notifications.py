@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Boolean, Index, false
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 
@@ -9,7 +9,7 @@ class Notification(Base):
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     message = Column(String)
-    is_read = Column(Boolean, default=False)
+    is_read = Column(Boolean, nullable=False, default=False, server_default=false())
     type = Column(String)  # 'connection_request', 'request_accepted', etc.
     related_request_id = Column(Integer, ForeignKey("connection_requests.id"))
     related_user_id = Column(Integer, ForeignKey("users.id"))
@@ -17,3 +17,16 @@ class Notification(Base):
 
     user = relationship("User", back_populates="notifications", foreign_keys=[user_id])
     related_user = relationship("User", foreign_keys=[related_user_id])
+
+    __table_args__ = (
+        # Feeds are keyset-paginated by id, newest first
+        Index("ix_notifications_user_is_read_id", "user_id", "is_read", "id"),
+        Index("ix_notifications_user_id_id", "user_id", "id"),
+    )
+
+
+# Unread notifications per user, maintained alongside inserts and mark-read updates
+class NotificationCounter(Base):
+    __tablename__ = "notification_counters"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    unread_count = Column(Integer, nullable=False, default=0)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db.base import Base
@@ -11,8 +11,15 @@ class Post(Base):
     content = Column(Text, nullable=False)
     image_url = Column(String, nullable=True)
     image_public_id = Column(String, nullable=True)
+    image_status = Column(String(16), nullable=True)  # None without an image, else pending/ready/failed
     created_at = Column(DateTime, default=datetime.utcnow)
     likes_count = Column(Integer, default=0)
 
     user = relationship("User", back_populates="posts")
     likes = relationship("Like", back_populates="post", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_posts_created_at_id", "created_at", "id"),
+        Index("ix_posts_user_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_posts_image_pending_created_at", "created_at", postgresql_where=(image_status == "pending")),
+    )
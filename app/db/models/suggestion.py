@@ -0,0 +1,19 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index
+from app.db.base import Base
+
+
+class UserSuggestion(Base):
+    """Precomputed "people you may know" entry, rebuilt by app.core.suggestions."""
+    __tablename__ = "user_suggestions"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    suggested_user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    mutual_count = Column(Integer, nullable=False)
+    # 1-based position in the user's list, by mutual_count desc then suggested_user_id
+    rank = Column(Integer, nullable=False)
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_user_suggestions_user_rank", "user_id", "rank", unique=True),
+    )
@@ -0,0 +1,27 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index
+from app.db.base import Base
+
+
+class TimelineEntry(Base):
+    """A post delivered to a user's home timeline (fan-out on write)."""
+    __tablename__ = "timeline_entries"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    author_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # Copied from the post so a timeline page is a single index range scan
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_timeline_entries_user_created_at_post", "user_id", "created_at", "post_id"),
+        Index("ix_timeline_entries_post_id", "post_id"),
+    )
+
+
+class TimelinePullAuthor(Base):
+    """Authors with too many friends to fan out to, read at query time instead."""
+    __tablename__ = "timeline_pull_authors"
+
+    author_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
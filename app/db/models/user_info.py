@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Date, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Date, Boolean, Index
 from datetime import datetime
 from sqlalchemy.orm import relationship
 from app.db.base import Base
@@ -24,3 +24,9 @@ class UserInfo(Base):
 
     user = relationship("User", back_populates="user_info")
 
+    __table_args__ = (
+        Index("ix_user_info_user_id", "user_id"),
+        # Admin review queue only ever looks at the unverified rows
+        Index("ix_user_info_unverified", "user_id", postgresql_where=(is_verified == False)),
+    )
+
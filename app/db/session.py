@@ -1,6 +1,9 @@
-import psycopg2
+import threading
+import time
+from fastapi import Request
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 import os
 import cloudinary
 from dotenv import load_dotenv 
@@ -16,28 +19,137 @@ cloudinary.config(
     secure=True
 )
 
-# Try to create the DB if it doesn't exist
-try:
-    conn = psycopg2.connect(dbname=os.getenv("DB_NAME"), user=os.getenv("DB_USER"), password=os.getenv("DB_PASS"), host=os.getenv("DB_HOST"))
-    conn.autocommit = True
-    cur = conn.cursor()
-    cur.execute(f"CREATE DATABASE {os.getenv('DB_NAME')}")
-    cur.close()
-    conn.close()
-except psycopg2.errors.DuplicateDatabase:
-    pass
-except Exception as e:
-    print(f"Warning: {e}")
-
 # Setup SQLAlchemy engine
 SQLALCHEMY_DATABASE_URL = f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASS')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# Read replica, falls back to the primary when DB_READ_HOST is not set
+READ_SQLALCHEMY_DATABASE_URL = f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASS')}@{os.getenv('DB_READ_HOST', os.getenv('DB_HOST'))}:{os.getenv('DB_READ_PORT', os.getenv('DB_PORT'))}/{os.getenv('DB_NAME')}"
+
+# Pool settings, tune per deployment from the environment
+POOL_OPTIONS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes"),
+}
+
+# After a user writes, their reads stay on the primary for this many seconds
+READ_STICKY_SECONDS = float(os.getenv("DB_READ_STICKY_SECONDS", "5"))
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **POOL_OPTIONS)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+if READ_SQLALCHEMY_DATABASE_URL == SQLALCHEMY_DATABASE_URL:
+    read_engine = engine
+else:
+    read_engine = create_engine(READ_SQLALCHEMY_DATABASE_URL, **POOL_OPTIONS)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Async engine (asyncpg) for `async def` routes and websockets so queries
+# don't block the event loop
+ASYNC_SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, **POOL_OPTIONS)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
+class PoolWaitStats:
+    """Time spent waiting for a pooled connection, per engine."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            stats = self._stats.setdefault(name, {"checkouts": 0, "total_wait_ms": 0.0, "max_wait_ms": 0.0})
+            wait_ms = seconds * 1000
+            stats["checkouts"] += 1
+            stats["total_wait_ms"] += wait_ms
+            stats["max_wait_ms"] = max(stats["max_wait_ms"], wait_ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    **stats,
+                    "avg_wait_ms": stats["total_wait_ms"] / stats["checkouts"] if stats["checkouts"] else 0.0,
+                }
+                for name, stats in self._stats.items()
+            }
+
+pool_wait_stats = PoolWaitStats()
+
+
+def get_pool_status() -> dict:
+    return {
+        "primary": engine.pool.status(),
+        "read": read_engine.pool.status(),
+        "async": async_engine.pool.status(),
+        "checkout_wait": pool_wait_stats.snapshot(),
+    }
+
+
+# Read-your-writes: tokens that wrote recently, mapped to the time of the write
+_recent_writes = {}
+_recent_writes_lock = threading.Lock()
+
+def mark_recent_write(token: str):
+    now = time.monotonic()
+    with _recent_writes_lock:
+        _recent_writes[token] = now
+        # Drop expired entries so the map stays bounded by active writers
+        if len(_recent_writes) > 10000:
+            for key in [k for k, t in _recent_writes.items() if now - t > READ_STICKY_SECONDS]:
+                del _recent_writes[key]
+
+def has_recent_write(token: str) -> bool:
+    with _recent_writes_lock:
+        written_at = _recent_writes.get(token)
+    return written_at is not None and time.monotonic() - written_at < READ_STICKY_SECONDS
+
+def get_request_token(request: Request):
+    authorization = request.headers.get("Authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    return token
+
+
+def _open_session(factory, name: str):
+    db = factory()
+    # Check out the connection up front so pool queueing is measured
+    started = time.perf_counter()
+    try:
+        db.connection()
+    except Exception:
+        db.close()
+        raise
+    pool_wait_stats.record(name, time.perf_counter() - started)
+    return db
+
 def get_db():
-    db = SessionLocal()
+    db = _open_session(SessionLocal, "primary")
     try:
         yield db
     finally:
         db.close()
+
+def get_read_db(request: Request):
+    token = get_request_token(request)
+    if read_engine is engine or (token and has_recent_write(token)):
+        db = _open_session(SessionLocal, "primary")
+    else:
+        db = _open_session(ReadSessionLocal, "read")
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        started = time.perf_counter()
+        await db.connection()
+        pool_wait_stats.record("async", time.perf_counter() - started)
+        yield db
@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from app.db.session import get_db
+from app.db.session import get_db, get_read_db, get_pool_status
 from app.db.models.user import User
 from app.db.models.notifications import Notification
 from app.db.models.user_info import UserInfo
 from app.schemas.user import UserOut, UnverifiedUserInfoResponse
-from app.core.security import get_current_admin
+from app.core.security import get_current_admin, invalidate_principal, Principal
+from app.core import notifications
+from app.core.outbound import get_queue_status
 from typing import List
 
 
@@ -14,16 +16,32 @@ router = APIRouter()
 @router.get("/dashboard")
 def admin_dashboard(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin)
 ):
     return {"msg": "Welcome to the admin dashboard"}
 
 
+#connection pool usage and checkout wait times
+@router.get("/db-pool")
+def db_pool_status(
+    current_user: Principal = Depends(get_current_admin)
+):
+    return get_pool_status()
+
+
+#websocket send queue depths and dropped slow consumers in this worker
+@router.get("/ws-queues")
+def ws_queue_status(
+    current_user: Principal = Depends(get_current_admin)
+):
+    return get_queue_status()
+
+
 #get all users except admin
 @router.get("/users", response_model=List[UserOut])
 def get_all_users(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_admin)
 ):
     users = db.query(User,UserInfo)\
         .outerjoin(UserInfo, User.id == UserInfo.user_id)\
@@ -53,8 +71,8 @@ def get_all_users(
 #get all unverified users
 @router.get("/unverified-users", response_model=List[UnverifiedUserInfoResponse])
 def get_unverified_users(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_admin)
 ):
     unverified_users = db.query(User, UserInfo)\
         .outerjoin(UserInfo, User.id == UserInfo.user_id)\
@@ -90,7 +108,7 @@ def get_unverified_users(
 def verify_user(
     user_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin)
 ):
     # First check if user exists
     user = db.query(User).filter(User.id == user_id).first()
@@ -109,6 +127,7 @@ def verify_user(
     
     db.commit()
     db.refresh(user_info)
+    invalidate_principal(user.id, user.email)
 
 
     #notify user about verification
@@ -119,6 +138,8 @@ def verify_user(
         related_user_id=user.id
     )
     db.add(notification)
+    db.execute(notifications.record_new_statement([user.id]))
     db.commit()
+    notifications.publish_new(user.id)
 
     return {"msg": "User verified successfully"}    
\ No newline at end of file
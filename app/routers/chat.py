@@ -1,223 +1,393 @@
+import asyncio
 from fastapi import WebSocket, WebSocketDisconnect
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, and_, or_, select, union_all, true
 from sqlalchemy.sql import case
 from collections import defaultdict
-from typing import List
+from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from datetime import datetime
-from app.db.session import get_db
+from app.db.session import get_db, get_read_db, get_async_db, AsyncSessionLocal, mark_recent_write
 from app.db.models.user import User
 from app.db.models.user_info import UserInfo
-from app.db.models.group import Group,GroupMessage,group_user_association
+from app.db.models.group import Group,GroupMessage,GroupReadCursor,group_user_association
 from app.db.models.message import Message
 from app.db.models.group import GroupMessage
-from app.core.security import get_current_user,are_friends,get_websocket_user
-from app.schemas.message import MessageBase
+from app.core.security import get_current_user,are_friends,async_are_friends,get_websocket_user,Principal
+from app.schemas.message import MessageBase, MessagePage
+from app.core.pagination import id_keyset_page, encode_cursor, decode_cursor
+from app.core import conversations, pubsub, chat_writer, presence
+from app.core.friends import get_friend_ids
+from app.core.outbound import OutboundQueue, dumps
+from app.db.models.conversation import Conversation
 
 
 router = APIRouter()
 
+# Group unread badges stop counting here, clients show e.g. "99+"
+UNREAD_COUNT_CAP = 100
+
 active_connections = defaultdict(dict)
 
+# Sockets are held by the worker they connected to. Messages go through
+# pub/sub on a per-room channel, so with a cross-worker backend they reach
+# recipients connected to any worker.
 class ConnectionManager:
     def __init__(self):
         self.active_connections = defaultdict(dict)
+        self._loop = None
+
+    @staticmethod
+    def channel(room_id: tuple) -> str:
+        return f"chat.{room_id[0]}.{room_id[1]}"
 
-    async def connect(self, websocket: WebSocket, user_id: int, friend_id: int):
+    async def connect(self, websocket: WebSocket, user_id: int, friend_id: int) -> OutboundQueue:
         await websocket.accept()
+        self._loop = asyncio.get_running_loop()
         room_id = tuple(sorted([user_id, friend_id]))
-        self.active_connections[room_id][user_id] = websocket
+        if room_id not in self.active_connections:
+            pubsub.subscribe(self.channel(room_id), self._on_event)
+        connection = OutboundQueue(websocket)
+        self.active_connections[room_id][user_id] = connection
+        return connection
 
     def disconnect(self, user_id: int, friend_id: int):
         room_id = tuple(sorted([user_id, friend_id]))
         if user_id in self.active_connections[room_id]:
-            del self.active_connections[room_id][user_id]
+            self.active_connections[room_id].pop(user_id).close()
         if not self.active_connections[room_id]:
             del self.active_connections[room_id]
-
+            pubsub.unsubscribe(self.channel(room_id), self._on_event)
+
+    def _on_event(self, event: dict):
+        # Publishers may run in threadpool workers, sockets are written from the loop
+        self._loop.call_soon_threadsafe(self._deliver, event)
+
+    def _deliver(self, event: dict):
+        room_id = tuple(event["room"])
+        connection = self.active_connections.get(room_id, {}).get(event["to"])
+        if connection is None:
+            return
+        if "message" in event:
+            connection.send_json(event["message"])
+        # Typing indicators are only relayed to /ws clients, read receipts go to both
+        elif event["event"] == "read":
+            connection.send_json({"type": "read", **event["data"]})
 
     async def send_personal_message(self, message: dict, user_id: int, friend_id: int):
         room_id = tuple(sorted([user_id, friend_id]))
-        if connection := self.active_connections[room_id].get(friend_id):
-            await connection.send_json(message)
+        pubsub.publish(self.channel(room_id), {"room": room_id, "to": friend_id, "message": message})
 
 manager = ConnectionManager()
 
+
+# Persist a direct message (or queue it with write-behind), returning the
+# payload sent to both participants and, with write-behind, its durability future
+async def store_direct_message(user: Principal, friend_id: int, content: str, token: str) -> tuple:
+    new_message = Message(
+        sender_id=user.id,
+        receiver_id=friend_id,
+        content=content,
+        timestamp=datetime.utcnow()
+    )
+    durable = None
+    if chat_writer.ENABLED:
+        new_message.id = await chat_writer.writer.message_ids.next()
+        durable = chat_writer.writer.submit(new_message)
+    else:
+        async with AsyncSessionLocal() as db:
+            db.add(new_message)
+            await db.flush()
+            # Conversation summary is updated in the same transaction
+            await db.execute(conversations.record_message_statement(new_message))
+            await db.commit()
+    mark_recent_write(token)
+
+    message_data = {
+        "id": new_message.id,
+        "sender_id": user.id,
+        "content": content,
+        "timestamp": new_message.timestamp.isoformat(),
+        "is_read": False
+    }
+    return message_data, durable
+
+
+async def store_group_message(user: Principal, group_id: int, content: str, token: str) -> tuple:
+    new_message = GroupMessage(
+        group_id=group_id,
+        sender_id=user.id,
+        content=content,
+        timestamp=datetime.utcnow()
+    )
+    durable = None
+    if chat_writer.ENABLED:
+        new_message.id = await chat_writer.writer.group_message_ids.next()
+        durable = chat_writer.writer.submit(new_message)
+    else:
+        async with AsyncSessionLocal() as db:
+            db.add(new_message)
+            await db.commit()
+    mark_recent_write(token)
+
+    message_data = {
+        "id": new_message.id,
+        "sender_id": user.id,
+        "content": content,
+        "timestamp": new_message.timestamp.isoformat(),
+        "sender_email": user.email
+    }
+    return message_data, durable
+
+
+async def async_is_group_member(db: AsyncSession, group_id: int, user_id: int) -> bool:
+    result = await db.execute(
+        select(group_user_association.c.group_id).filter(
+            group_user_association.c.group_id == group_id,
+            group_user_association.c.user_id == user_id
+        )
+    )
+    return result.first() is not None
+
+
+# With write-behind persistence, senders get an ack once the message is committed
+async def ack_when_durable(connection: OutboundQueue, durable: asyncio.Future, message_id: int):
+    try:
+        await durable
+        connection.send_json({"type": "ack", "id": message_id})
+    except Exception:
+        connection.send_json({"type": "error", "id": message_id, "error": "Message was not saved"})
+
 @router.websocket("/ws/chat/{friend_id}")
 async def websocket_chat(
     websocket: WebSocket,
     friend_id: int,
-    token: str,
-    db: Session = Depends(get_db)
+    token: str
 ):
-    user = await get_websocket_user(token, db)
+    # Sessions are opened per operation, an idle socket holds no pooled connection
+    async with AsyncSessionLocal() as db:
+        user = await get_websocket_user(token, db)
+        is_friend = user is not None and await async_are_friends(db, user.id, friend_id)
     if not user:
         await websocket.send_json({"error": "Invalid token"})
         await websocket.close(code=1008)
         return
     
     # Verify friendship
-    if not are_friends(db, user.id, friend_id):
+    if not is_friend:
         await websocket.send_json({"error": "Not friends"})
         await websocket.close(code=1008)
         return
 
-    await manager.connect(websocket, user.id, friend_id)
+    connection = await manager.connect(websocket, user.id, friend_id)
+    presence.connected(user.id)
     
     try:
         while True:
 
             data = await websocket.receive_json()
+            presence.heartbeat(user.id)
 
             # Validate data
             if "message" not in data:
-                await websocket.send_json({"error": "Invalid message format"})
+                connection.send_json({"error": "Invalid message format"})
                 continue
             
-            # Save message to database
-            new_message = Message(
-                sender_id=user.id,
-                receiver_id=friend_id,
-                content=data["message"],
-                timestamp=datetime.utcnow()
-            )
-            db.add(new_message)
-            db.commit()
-            
-            # Prepare response
-            message_data = {
-                "sender_id": user.id,
-                "content": data["message"],
-                "timestamp": new_message.timestamp.isoformat(),
-                "is_read": False
-            }
+            message_data, durable = await store_direct_message(user, friend_id, data["message"], token)
             
             # Send to both participants
-            await websocket.send_json(message_data)
+            connection.send_json(message_data)
             await manager.send_personal_message(message_data, user.id, friend_id)
+            if durable:
+                asyncio.create_task(ack_when_durable(connection, durable, message_data["id"]))
             
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(user.id, friend_id)
+        presence.disconnected(user.id)
+
 
 
 
+# Online state of friends, served from the in-memory presence index.
+# Ids that aren't friends of the caller are left out.
+@router.get("/presence")
+def get_presence(
+    ids: List[int] = Query(..., max_length=presence.MAX_BULK_IDS),
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    return presence.friend_states(ids, get_friend_ids(db, current_user.id))
+
 
-# Get chat history
-@router.get("/history/{friend_id}", response_model=List[MessageBase])
+# Get chat history, newest first. Page back with `cursor` (or before_id),
+# poll for newer messages with after_id, or jump to a message with around_id
+@router.get("/history/{friend_id}", response_model=MessagePage)
 def get_chat_history(
     friend_id: int,
-    page: int = Query(1, ge=1),
+    cursor: Optional[str] = None,
+    before_id: Optional[int] = Query(None, ge=1),
+    after_id: Optional[int] = Query(None, ge=0),
+    around_id: Optional[int] = Query(None, ge=1),
     page_size: int = Query(50, ge=1, le=100),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     if not are_friends(db, current_user.id, friend_id):
         raise HTTPException(status_code=403, detail="Not friends")
-    
-    return db.query(Message)\
-        .filter(
-            ((Message.sender_id == current_user.id) &
-             (Message.receiver_id == friend_id)) |
-            ((Message.sender_id == friend_id) &
-             (Message.receiver_id == current_user.id))
-        )\
-        .order_by(Message.timestamp.asc())\
-        .offset((page-1)*page_size)\
-        .limit(page_size)\
-        .all()  
+
+    directions = [(current_user.id, friend_id), (friend_id, current_user.id)]
+
+    # One index range scan per direction so cost doesn't grow with history size
+    def fetch(id_filter, order, limit):
+        legs = [
+            select(Message.id)
+            .filter(Message.sender_id == sender_id, Message.receiver_id == receiver_id, id_filter)
+            .order_by(order)
+            .limit(limit)
+            .subquery()
+            for sender_id, receiver_id in directions
+        ]
+        ids = union_all(*[select(leg.c.id) for leg in legs]).subquery()
+        return db.query(Message)\
+            .filter(Message.id.in_(select(ids.c.id)))\
+            .order_by(order)\
+            .limit(limit)\
+            .all()
+
+    def fetch_older(before, limit):
+        return fetch(Message.id < before if before is not None else true(), Message.id.desc(), limit)
+
+    def fetch_newer(after, limit):
+        return fetch(Message.id > after, Message.id.asc(), limit)
+
+    return id_keyset_page(fetch_older, fetch_newer, page_size, cursor, before_id, after_id, around_id)
 
 
 
 #get all chats
+# Private chats come from the conversations summary, newest activity first and
+# paginated by `cursor`; group chats are listed on the first page only.
 @router.get("/all")
 def get_all_chats(
-    page: int = Query(1, ge=1),
+    cursor: Optional[str] = None,
     page_size: int = Query(50, ge=1, le=100),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    # PRIVATE CHATS with actual conversation or friends
-    message_partners_subq = (
-        db.query(
-            case(
-                (Message.sender_id == current_user.id, Message.receiver_id),
-                (Message.receiver_id == current_user.id, Message.sender_id),
-                else_=None
-            ).label("partner_id")
-        )
-        .filter(
-            or_(
-                Message.sender_id == current_user.id,
-                Message.receiver_id == current_user.id
-            )
-        )
-        .distinct()
-        .subquery()
+    before_message_id = None
+    if cursor:
+        before_message_id = decode_cursor(cursor).get("before_message_id")
+        if not isinstance(before_message_id, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # One LIMITed index range per side of the pair, merged by last message id
+    legs = []
+    for side in (Conversation.user_low_id, Conversation.user_high_id):
+        leg = select(Conversation).filter(side == current_user.id, Conversation.last_message_id.isnot(None))
+        if before_message_id is not None:
+            leg = leg.filter(Conversation.last_message_id < before_message_id)
+        legs.append(leg.order_by(Conversation.last_message_id.desc()).limit(page_size + 1).subquery())
+    conversation = aliased(Conversation, union_all(*[select(leg) for leg in legs]).subquery())
+
+    partner_id = case(
+        (conversation.user_low_id == current_user.id, conversation.user_high_id),
+        else_=conversation.user_low_id
     )
+    rows = db.query(conversation, User, UserInfo.profile_picture)\
+        .join(User, User.id == partner_id)\
+        .outerjoin(UserInfo, UserInfo.user_id == User.id)\
+        .order_by(conversation.last_message_id.desc())\
+        .limit(page_size + 1)\
+        .all()
 
-    partners = db.query(User).join(message_partners_subq, User.id == message_partners_subq.c.partner_id).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
 
     private_messages = []
-    for user in partners:
-        last_msg = (
-            db.query(Message)
-            .filter(
-                or_(
-                    and_(Message.sender_id == current_user.id, Message.receiver_id == user.id),
-                    and_(Message.receiver_id == current_user.id, Message.sender_id == user.id)
-                )
-            )
-            .order_by(Message.timestamp.desc())
-            .first()
-        )
-
-        user_info = db.query(UserInfo).filter(UserInfo.user_id == user.id).first()
-
+    for conv, partner, profile_picture in rows:
+        sender = current_user if conv.last_sender_id == current_user.id else partner
         private_messages.append({
-            "id": user.id,
-            "name": f"{user.first_name} {user.last_name}",
-            "profile_picture": user_info.profile_picture if user_info else None,
-            "last_message": {
-                "sender": f"{last_msg.sender.first_name} {last_msg.sender.last_name}" if last_msg else "",
-                "content": last_msg.content if last_msg else ""
-            }
-        })
-
-    # --- GROUP CHATS (unchanged) ---
-    groups = (
-        db.query(Group)
-        .join(group_user_association, group_user_association.c.group_id == Group.id)
-        .filter(group_user_association.c.user_id == current_user.id)
-        .all()
-    )
-
-    group_messages = []
-    for group in groups:
-        last_msg = (
-            db.query(GroupMessage)
-            .filter(GroupMessage.group_id == group.id)
-            .order_by(GroupMessage.timestamp.desc())
-            .first()
-        )
-        participants = group.members
-        group_messages.append({
-            "id": group.id,
-            "name": group.name,
+            "id": partner.id,
+            "name": f"{partner.first_name} {partner.last_name}",
+            "profile_picture": profile_picture,
             "last_message": {
-                "sender": f"{last_msg.sender.first_name} {last_msg.sender.last_name}" if last_msg and last_msg.sender else "",
-                "content": last_msg.content if last_msg else ""
+                "sender": f"{sender.first_name} {sender.last_name}",
+                "content": conv.last_message_preview or "",
+                "timestamp": conv.last_message_at
             },
-            "participants_names": [member.first_name for member in participants],
-            "participants_ids": [member.id for member in participants]
+            "unread_count": conv.unread_low if conv.user_low_id == current_user.id else conv.unread_high,
+            # How far the partner has read, for "seen" ticks on sent messages
+            "partner_read_up_to_id": conv.read_high_id if conv.user_low_id == current_user.id else conv.read_low_id
         })
 
     return {
         "private_message": private_messages,
-        "group_message": group_messages
+        "group_message": get_group_chats(db, current_user) if cursor is None else [],
+        "next_cursor": encode_cursor(before_message_id=rows[-1][0].last_message_id) if has_more else None
     }
 
 
+def get_group_chats(db: Session, current_user: Principal) -> list:
+    # Latest message per group through a LATERAL index lookup, no per-group queries
+    last_msg = select(GroupMessage.content, GroupMessage.sender_id)\
+        .filter(GroupMessage.group_id == Group.id)\
+        .order_by(GroupMessage.id.desc())\
+        .limit(1)\
+        .lateral()
+    # Unread count from the (group_id, id) index past the member's read cursor,
+    # capped so a long-ignored group costs at most UNREAD_COUNT_CAP rows
+    unread_rows = select(GroupMessage.id)\
+        .filter(
+            GroupMessage.group_id == Group.id,
+            GroupMessage.id > func.coalesce(GroupReadCursor.last_read_message_id, 0),
+            GroupMessage.sender_id != current_user.id
+        )\
+        .correlate(Group, GroupReadCursor)\
+        .limit(UNREAD_COUNT_CAP)\
+        .subquery()
+    unread = select(func.count().label("unread_count")).select_from(unread_rows).lateral()
+    sender = aliased(User)
+    groups = db.query(Group.id, Group.name, last_msg.c.content, sender.first_name, sender.last_name, unread.c.unread_count)\
+        .join(group_user_association, group_user_association.c.group_id == Group.id)\
+        .outerjoin(GroupReadCursor, and_(
+            GroupReadCursor.group_id == Group.id,
+            GroupReadCursor.user_id == current_user.id
+        ))\
+        .outerjoin(last_msg, true())\
+        .outerjoin(sender, sender.id == last_msg.c.sender_id)\
+        .outerjoin(unread, true())\
+        .filter(group_user_association.c.user_id == current_user.id)\
+        .all()
+
+    # All members of those groups in one query
+    members = defaultdict(list)
+    if groups:
+        for group_id, member_id, first_name in db.query(
+            group_user_association.c.group_id, User.id, User.first_name
+        ).join(User, User.id == group_user_association.c.user_id)\
+            .filter(group_user_association.c.group_id.in_([g.id for g in groups]))\
+            .all():
+            members[group_id].append((member_id, first_name))
+
+    return [
+        {
+            "id": group_id,
+            "name": name,
+            "last_message": {
+                "sender": f"{first_name} {last_name}" if first_name else "",
+                "content": content or ""
+            },
+            "participants_names": [member_name for _, member_name in members[group_id]],
+            "participants_ids": [member_id for member_id, _ in members[group_id]],
+            "unread_count": unread_count
+        }
+        for group_id, name, content, first_name, last_name, unread_count in groups
+    ]
+
+
 
 
 # Mark message as read
@@ -225,7 +395,7 @@ def get_all_chats(
 def mark_as_read(
     message_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     message = db.query(Message)\
         .filter(Message.id == message_id)\
@@ -234,28 +404,94 @@ def mark_as_read(
     if not message or message.receiver_id != current_user.id:
         raise HTTPException(status_code=404, detail="Message not found")
     
-    message.is_read = True
+    if not message.is_read:
+        message.is_read = True
+        db.execute(conversations.mark_read_statement(current_user.id, message.sender_id))
     db.commit()
     return {"status": "marked as read"}  
 
 
+# Mark everything from a friend up to message_id as read and tell the sender.
+# Async so the receipt is published from the event loop, where socket
+# delivery has to happen.
+@router.put("/read/{friend_id}")
+async def mark_read_up_to(
+    friend_id: int,
+    message_id: int = Query(..., ge=1),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    if not await async_are_friends(db, current_user.id, friend_id):
+        raise HTTPException(status_code=403, detail="Not friends with this user")
+
+    # Never past the newest message actually received from the friend
+    up_to_id = await db.scalar(
+        select(func.max(Message.id)).filter(
+            Message.sender_id == friend_id,
+            Message.receiver_id == current_user.id,
+            Message.id <= message_id
+        )
+    )
+    if up_to_id is None:
+        return {"status": "marked as read", "read_up_to_id": None, "marked": 0}
+
+    updated = (await db.execute(conversations.read_up_to_statement(current_user.id, friend_id, up_to_id))).rowcount
+    read_up_to_id = (await db.execute(
+        conversations.advance_watermark_statement(current_user.id, friend_id, up_to_id, updated)
+    )).scalar()
+    await db.commit()
+
+    if updated:
+        room_id = tuple(sorted([current_user.id, friend_id]))
+        pubsub.publish(manager.channel(room_id), {
+            "room": room_id,
+            "to": friend_id,
+            "event": "read",
+            "data": {"reader_id": current_user.id, "read_up_to_id": read_up_to_id}
+        })
+    return {"status": "marked as read", "read_up_to_id": read_up_to_id, "marked": updated}
+
+
 #Group chat  
 
 class GroupConnectionManager:
     def __init__(self):
         self.active_groups = defaultdict(dict)  # {group_id: {user_id: websocket}}
+        self._loop = None
 
-    async def connect(self, websocket: WebSocket, group_id: int, user_id: int):
+    @staticmethod
+    def channel(group_id: int) -> str:
+        return f"group.{group_id}"
+
+    async def connect(self, websocket: WebSocket, group_id: int, user_id: int) -> OutboundQueue:
         await websocket.accept()
-        self.active_groups[group_id][user_id] = websocket
+        self._loop = asyncio.get_running_loop()
+        if group_id not in self.active_groups:
+            pubsub.subscribe(self.channel(group_id), self._on_event)
+        connection = OutboundQueue(websocket)
+        self.active_groups[group_id][user_id] = connection
+        return connection
 
     def disconnect(self, group_id: int, user_id: int):
         if user_id in self.active_groups[group_id]:
-            del self.active_groups[group_id][user_id]
+            self.active_groups[group_id].pop(user_id).close()
+        if not self.active_groups[group_id]:
+            del self.active_groups[group_id]
+            pubsub.unsubscribe(self.channel(group_id), self._on_event)
+
+    def _on_event(self, event: dict):
+        self._loop.call_soon_threadsafe(self._deliver, event)
+
+    def _deliver(self, event: dict):
+        if "message" not in event:
+            return
+        # Serialized once and queued to every member; a full queue drops only that member
+        text = dumps(event["message"])
+        for connection in list(self.active_groups.get(event["group_id"], {}).values()):
+            connection.send_text(text)
 
     async def broadcast(self, message: dict, group_id: int):
-        for connection in self.active_groups[group_id].values():
-            await connection.send_json(message)
+        pubsub.publish(self.channel(group_id), {"group_id": group_id, "message": message})
 
 group_manager = GroupConnectionManager()
 
@@ -263,37 +499,49 @@ group_manager = GroupConnectionManager()
 async def group_chat_websocket(
     websocket: WebSocket,
     group_id: int,
-    token: str,
-    db: Session = Depends(get_db)
+    token: str
 ):
-    user = await get_websocket_user(token, db)
+    # Checked up front, a message for a group the sender can't post to
+    # would fail the whole write-behind batch it lands in
+    async with AsyncSessionLocal() as db:
+        user = await get_websocket_user(token, db)
+        is_member = user is not None and await async_is_group_member(db, group_id, user.id)
+    if not user:
+        await websocket.accept()
+        await websocket.send_json({"error": "Invalid token"})
+        await websocket.close(code=1008)
+        return
+
+    if not is_member:
+        await websocket.accept()
+        await websocket.send_json({"error": "Not a group member"})
+        await websocket.close(code=1008)
+        return
 
-    await group_manager.connect(websocket, group_id, user.id)
+    connection = await group_manager.connect(websocket, group_id, user.id)
+    presence.connected(user.id)
     
     try:
         while True:
             data = await websocket.receive_json()
+            presence.heartbeat(user.id)
+
+            # Heartbeats and other frames without a message only count as activity
+            if not isinstance(data, dict) or "message" not in data:
+                continue
+            if not isinstance(data["message"], str):
+                connection.send_json({"error": "Invalid message format"})
+                continue
             
-            # Save message
-            new_message = GroupMessage(
-                group_id=group_id,
-                sender_id=user.id,
-                content=data["message"],
-                timestamp=datetime.utcnow()
-            )
-            db.add(new_message)
-            db.commit()
-            
-            # Prepare response
-            message_data = {
-                "sender_id": user.id,
-                "content": data["message"],
-                "timestamp": new_message.timestamp.isoformat(),
-                "sender_email": user.email
-            }
+            message_data, durable = await store_group_message(user, group_id, data["message"], token)
             
             # Broadcast to group
             await group_manager.broadcast(message_data, group_id)
+            if durable:
+                asyncio.create_task(ack_when_durable(connection, durable, message_data["id"]))
             
     except WebSocketDisconnect:
-        group_manager.disconnect(group_id, user.id)          
\ No newline at end of file
+        pass
+    finally:
+        group_manager.disconnect(group_id, user.id)
+        presence.disconnected(user.id)          
\ No newline at end of file
@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status,WebSocket, WebSocketDisconnect
-from sqlalchemy.orm import Session, joinedload
-from typing import List
-from app.db.session import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, status,WebSocket, WebSocketDisconnect
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from app.db.session import get_async_db, AsyncSessionLocal
 from app.db.models.user import User
-from app.db.models.notifications import Notification
+from app.db.models.user_info import UserInfo
+from app.db.models.notifications import Notification, NotificationCounter
 from app.db.models.connection_request import ConnectionRequest
-from app.core.security import get_current_user, get_websocket_user
-from app.schemas.notifications import NotificationBase, NotificationResponse
+from app.core.security import get_current_user, get_websocket_user, Principal
+from app.core import timeline, notifications
+from app.core.friends import async_get_friend_ids, publish_friendship_added
+from app.core.pagination import encode_cursor, decode_cursor
+from app.schemas.notifications import NotificationBase, NotificationResponse, NotificationPage
 from app.schemas.connection_request import FriendResponse
 import asyncio
 
@@ -16,20 +21,21 @@ router = APIRouter()
 @router.post("/request/{receiver_id}")
 async def send_connection_request(
     receiver_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     # Check if receiver exists
-    receiver = db.query(User).get(receiver_id)
+    receiver = await db.get(User, receiver_id)
     if not receiver:
         raise HTTPException(status_code=404, detail="User not found")
 
     # Check for existing request
-    existing = db.query(ConnectionRequest).filter(
+    result = await db.execute(select(ConnectionRequest).filter(
         ConnectionRequest.sender_id == current_user.id,
         ConnectionRequest.receiver_id == receiver_id,
         ConnectionRequest.status == "pending"
-    ).first()
+    ))
+    existing = result.scalars().first()
     
     if existing:
         raise HTTPException(status_code=400, detail="Request already sent")
@@ -41,6 +47,9 @@ async def send_connection_request(
         status="pending"
     )
     
+    db.add(new_request)
+    await db.flush()
+
     # Create notification
     notification = Notification(
         user_id=receiver_id,
@@ -49,9 +58,10 @@ async def send_connection_request(
         related_request_id=new_request.id
     )
 
-    db.add(new_request)
     db.add(notification)
-    db.commit()
+    await db.execute(notifications.record_new_statement([receiver_id]))
+    await db.commit()
+    notifications.publish_new(receiver_id)
     
     return {"message": "Connection request sent"}
 
@@ -59,10 +69,10 @@ async def send_connection_request(
 @router.put("/accept/{request_id}")
 async def accept_connection_request(
     request_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    request = db.query(ConnectionRequest).get(request_id)
+    request = await db.get(ConnectionRequest, request_id)
     
     if not request or request.receiver_id != current_user.id:
         raise HTTPException(status_code=404, detail="Request not found")
@@ -80,122 +90,137 @@ async def accept_connection_request(
     )
     
     db.add(sender_notification)
-    db.commit()
+    await db.execute(notifications.record_new_statement([request.sender_id]))
+    await timeline.backfill_friendship(db, request.sender_id, request.receiver_id)
+    await db.commit()
+    timeline.publish_invalidate([request.sender_id, request.receiver_id])
+    publish_friendship_added(request.sender_id, request.receiver_id)
+    notifications.publish_new(request.sender_id)
     
     return {"message": "Request accepted"}
 
-# Get notifications
-@router.get("/notifications", response_model=List[NotificationBase])
+# Get notifications, newest first
+@router.get("/notifications", response_model=NotificationPage)
 async def get_notifications(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    cursor: Optional[str] = None,
+    page_size: int = Query(20, ge=1, le=100),
+    unread_only: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    return db.query(Notification)\
-        .filter(Notification.user_id == current_user.id)\
-        .order_by(Notification.created_at.desc())\
-        .all()
+    query = select(Notification).filter(Notification.user_id == current_user.id)
+    if unread_only:
+        query = query.filter(Notification.is_read == False)
+    if cursor:
+        before_id = decode_cursor(cursor).get("before_id")
+        if not isinstance(before_id, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(Notification.id < before_id)
+
+    result = await db.execute(query.order_by(Notification.id.desc()).limit(page_size + 1))
+    items = result.scalars().all()
+    has_more = len(items) > page_size
+    items = items[:page_size]
+    return {
+        "items": items,
+        "next_cursor": encode_cursor(before_id=items[-1].id) if has_more else None
+    }
+
+
+# Unread badge, read from the maintained counter
+@router.get("/notifications/unread-count")
+async def get_unread_notification_count(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    count = await db.scalar(
+        select(NotificationCounter.unread_count)
+        .filter(NotificationCounter.user_id == current_user.id)
+    )
+    return {"unread_count": count or 0}
+
+
+# Mark every notification up to up_to_id as read, or all of them when omitted
+@router.put("/notifications/read")
+async def mark_notifications_read(
+    up_to_id: Optional[int] = Query(None, ge=1),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    result = await db.execute(notifications.mark_read_statement(current_user.id, up_to_id=up_to_id))
+    if result.rowcount:
+        await db.execute(notifications.decrement_unread_statement(current_user.id, result.rowcount))
+    await db.commit()
+    return {"status": "marked as read", "marked": result.rowcount}
 
 
 # Mark notification as read
 @router.put("/notifications/{notification_id}/read")
-def mark_notification_read(
+async def mark_notification_read(
     notification_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    notification = db.query(Notification)\
-        .filter(Notification.id == notification_id,
-                Notification.user_id == current_user.id)\
-        .first()
-    
-    if notification:
-        notification.is_read = True
-        db.commit()
+    result = await db.execute(notifications.mark_read_statement(current_user.id, notification_id=notification_id))
+    if result.rowcount:
+        await db.execute(notifications.decrement_unread_statement(current_user.id, result.rowcount))
+        await db.commit()
     
     return {"status": "marked as read"}
 
       
+async def _until_disconnect(websocket: WebSocket):
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
 # WebSocket for real-time notifications
+# New notifications are pushed as they are committed. On connect the client
+# gets everything after last_seen_id, or all unread ones if it has none.
 @router.websocket("/ws/notifications")
 async def websocket_notifications(
     websocket: WebSocket,
     token: str,
-    db: Session = Depends(get_db)
+    last_seen_id: Optional[int] = None
 ):
     await websocket.accept()
-    user = await get_websocket_user(token, db)
-    
-    try:
-        while True:
-            notifications = db.query(Notification)\
-                .options(joinedload(Notification.related_user))\
-                .filter(
-                    Notification.user_id == user.id,
-                    Notification.is_read == False
-                )\
-                .all()
-
-            if notifications:
-                await websocket.send_json([
-                    {
-                        "id": n.id,
-                        "message": n.message,
-                        "type": n.type,
-                        "created_at": n.created_at.isoformat(),
-                        "related_user": {
-                            "id": n.related_user.id,
-                            "email": n.related_user.email
-                        } if n.related_user else None
-                    }
-                    for n in notifications
-                ])
-            
-            await asyncio.sleep(60) # Check every 60 seconds
-    
-    except WebSocketDisconnect:
-        pass
-    
+    async with AsyncSessionLocal() as db:
+        user = await get_websocket_user(token, db)
+    if not user:
+        await websocket.send_json({"error": "Invalid token"})
+        await websocket.close(code=1008)
+        return
+
+    disconnected = asyncio.create_task(_until_disconnect(websocket))
+    # Subscribe before the catch-up read so nothing committed in between is missed
+    with notifications.Wakeup(user.id) as wakeup:
+        try:
+            while not disconnected.done():
+                wakeup.event.clear()
+                last_seen_id = await notifications.push_new(websocket.send_json, user.id, last_seen_id)
+                woken = asyncio.create_task(wakeup.event.wait())
+                await asyncio.wait({woken, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                woken.cancel()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            disconnected.cancel()
+
 
 @router.get("/friends", response_model=List[FriendResponse])
-def get_friends(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+async def get_friends(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    # Get all connections where current user is either sender or receiver
-    connections = db.query(ConnectionRequest)\
-        .options(
-            joinedload(ConnectionRequest.sender).joinedload(User.user_info),
-            joinedload(ConnectionRequest.receiver).joinedload(User.user_info)
-        )\
-        .filter(
-            ((ConnectionRequest.sender_id == current_user.id) |
-             (ConnectionRequest.receiver_id == current_user.id)),
-            ConnectionRequest.status == "accepted"
-        )\
-        .all()
-
-    friends = []
-    seen_ids = set()
-
-    for conn in connections:
-        # Determine friend object
-        if conn.sender_id == current_user.id:
-            friend = conn.receiver
-        else:
-            friend = conn.sender
-
-        # Skip duplicates
-        if friend.id in seen_ids:
-            continue
-            
-        seen_ids.add(friend.id)
-
-        friends.append({
-            "id": friend.id,
-            "email": friend.email,
-            "first_name": friend.first_name,
-            "last_name": friend.last_name,
-            "profile_picture": friend.user_info.profile_picture if friend.user_info else None
-        })
-
-    return friends
\ No newline at end of file
+    # Friend ids come from the in-memory graph, profiles in a single query
+    friend_ids = await async_get_friend_ids(db, current_user.id)
+    if not friend_ids:
+        return []
+
+    result = await db.execute(
+        select(User.id, User.email, User.first_name, User.last_name, UserInfo.profile_picture)
+        .outerjoin(UserInfo, UserInfo.user_id == User.id)
+        .filter(User.id.in_(friend_ids))
+        .order_by(User.id)
+    )
+    return [dict(row._mapping) for row in result]
@@ -1,29 +1,44 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, select
-from typing import List
+from sqlalchemy import func, select, literal
+from typing import List, Optional
+from datetime import datetime
 from app.db.models.user import User
-from app.db.models.group import Group, GroupMessage, group_user_association
+from sqlalchemy.dialects.postgresql import insert
+from app.db.models.group import Group, GroupMessage, GroupReadCursor, group_user_association
 from app.db.session import get_db
-from app.core.security import get_current_user
-from app.schemas.groups import GroupCreate, GroupBase, GroupResponse
+from app.core.security import get_current_user, Principal
+from app.core.pagination import id_keyset_page
+from app.schemas.groups import GroupCreate, GroupBase, GroupResponse, GroupMessagePage
 from app.schemas.groups import GroupMessage as GroupMessageSchema
 
 router = APIRouter()
 
+
+# Members start with every message already in the group marked read
+def start_read_cursors_statement(group_id: int, user_ids: List[int]):
+    newest_id = select(func.coalesce(func.max(GroupMessage.id), 0))\
+        .filter(GroupMessage.group_id == group_id)\
+        .scalar_subquery()
+    rows = select(literal(group_id), User.id, newest_id, literal(datetime.utcnow()))\
+        .filter(User.id.in_(user_ids))
+    return insert(GroupReadCursor).from_select(
+        ["group_id", "user_id", "last_read_message_id", "updated_at"], rows
+    ).on_conflict_do_nothing()
+
 # Create group and auto-add creator as member
 @router.post("/create", response_model=GroupBase)
 def create_group(
     group_data: GroupCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     new_group = Group(
         name=group_data.name,
         owner_id=current_user.id
     )
     # Add creator as a member
-    new_group.members.append(current_user)
+    new_group.members.append(db.get(User, current_user.id))
 
     # Add other members if provided
     if group_data.member_ids:
@@ -33,6 +48,8 @@ def create_group(
                 new_group.members.append(user)
 
     db.add(new_group)
+    db.flush()
+    db.execute(start_read_cursors_statement(new_group.id, [user.id for user in new_group.members]))
     db.commit()
     db.refresh(new_group)
     return new_group
@@ -44,7 +61,7 @@ def add_member(
     group_id: int,
     member_data: List[int],
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     group = db.query(Group).filter_by(id=group_id).first()
     if not group:
@@ -53,34 +70,89 @@ def add_member(
         raise HTTPException(status_code=403, detail="Not authorized")
 
     users = db.query(User).filter(User.id.in_(member_data)).all()
-    for user in users:
-        if user not in group.members:
-            group.members.append(user)
+    added = [user for user in users if user not in group.members]
+    group.members.extend(added)
+    if added:
+        db.flush()
+        db.execute(start_read_cursors_statement(group_id, [user.id for user in added]))
 
     db.commit()
     return {"message": f"{len(users)} members added to the group."}
 
 
-# Get group messages
-@router.get("/{group_id}/messages", response_model=List[GroupMessageSchema])
+# Get group messages, newest first, same cursor modes as chat history
+@router.get("/{group_id}/messages", response_model=GroupMessagePage)
 def get_group_messages(
     group_id: int,
-    page: int = Query(1, ge=1),
+    cursor: Optional[str] = None,
+    before_id: Optional[int] = Query(None, ge=1),
+    after_id: Optional[int] = Query(None, ge=0),
+    around_id: Optional[int] = Query(None, ge=1),
     page_size: int = Query(50, ge=1, le=100),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     # Verify current user is in the group
-    group = db.query(Group).filter(Group.id == group_id).first()
-    if not group or current_user not in group.members:
+    is_member = db.query(group_user_association)\
+        .filter(group_user_association.c.group_id == group_id,
+                group_user_association.c.user_id == current_user.id)\
+        .first()
+    if not is_member:
+        raise HTTPException(status_code=403, detail="Not a group member")
+
+    def fetch_older(before, limit):
+        query = db.query(GroupMessage).filter(GroupMessage.group_id == group_id)
+        if before is not None:
+            query = query.filter(GroupMessage.id < before)
+        return query.order_by(GroupMessage.id.desc()).limit(limit).all()
+
+    def fetch_newer(after, limit):
+        return db.query(GroupMessage)\
+            .filter(GroupMessage.group_id == group_id, GroupMessage.id > after)\
+            .order_by(GroupMessage.id.asc())\
+            .limit(limit)\
+            .all()
+
+    return id_keyset_page(fetch_older, fetch_newer, page_size, cursor, before_id, after_id, around_id)
+
+
+# Mark group messages as read up to message_id, cursors only move forward
+@router.put("/{group_id}/read")
+def mark_group_read(
+    group_id: int,
+    message_id: int = Query(..., ge=1),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    is_member = db.query(group_user_association)\
+        .filter(group_user_association.c.group_id == group_id,
+                group_user_association.c.user_id == current_user.id)\
+        .first()
+    if not is_member:
         raise HTTPException(status_code=403, detail="Not a group member")
 
-    return db.query(GroupMessage)\
+    # Never past the group's newest message, or later messages would never count as unread
+    newest_id = db.query(func.max(GroupMessage.id))\
         .filter(GroupMessage.group_id == group_id)\
-        .order_by(GroupMessage.timestamp.asc())\
-        .offset((page - 1) * page_size)\
-        .limit(page_size)\
-        .all()
+        .scalar()
+    if newest_id is None:
+        raise HTTPException(status_code=404, detail="Group has no messages")
+
+    statement = insert(GroupReadCursor).values(
+        group_id=group_id,
+        user_id=current_user.id,
+        last_read_message_id=min(message_id, newest_id),
+        updated_at=datetime.utcnow()
+    )
+    last_read_message_id = db.execute(statement.on_conflict_do_update(
+        index_elements=[GroupReadCursor.group_id, GroupReadCursor.user_id],
+        set_={
+            "last_read_message_id": func.greatest(GroupReadCursor.last_read_message_id, statement.excluded.last_read_message_id),
+            "updated_at": statement.excluded.updated_at
+        }
+    ).returning(GroupReadCursor.last_read_message_id)).scalar()
+    db.commit()
+    return {"status": "marked as read", "last_read_message_id": last_read_message_id}
 
 
 # Show user's groups
@@ -89,7 +161,7 @@ def get_user_groups(
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     groups_query = (
         db.query(
@@ -3,43 +3,35 @@ from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.schemas import post as schemas
 from app.schemas.post import PostOut
-from app.db.models.post import Post
-from app.db.models.like import Like
+from app.core.likes import toggle_like_statement, toggle_like_rows_statement
+from app.core import like_counter
 from app.core.security import get_current_user
 
 router = APIRouter(prefix="/like", tags=["Likes"])
 
 @router.post("/{post_id}")
 def toogle_like(
-    post_id: str,
+    post_id: int,
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user)
 ):
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
+    if like_counter.ENABLED:
+        # likes_count is updated later by the counter, not on this request
+        row = db.execute(toggle_like_rows_statement(current_user.id, post_id)).first()
+    else:
+        # Like or unlike and adjust likes_count in a single statement
+        row = db.execute(toggle_like_statement(current_user.id, post_id)).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Post not found")
-    
-    #Check if the user has already liked the post
-
-    existing_like = db.query(Like).filter(
-        Like.user_id == current_user.id,
-        Like.post_id == post_id
-    ).first()
 
-    if existing_like:
-        # If the user has already liked the post, remove the like
-        db.delete(existing_like)
-        post.likes_count -= 1
-        message = "Like removed"
-    else:
-        # If the user has not liked the post, add a like
-        new_like = Like(user_id=current_user.id, post_id=post_id)
-        db.add(new_like)
-        post.likes_count += 1
-        message = "Post liked"
+    post, liked = row.Post, row.liked
+    result = {
+        "msg": "Post liked" if liked else "Like removed",
+        "post": PostOut.from_orm(post),
+    }
     db.commit()
+    if like_counter.ENABLED:
+        like_counter.counter.add(post_id, row.delta)
+        result["post"].likes_count = like_counter.counter.count(post)
 
-    return {
-        "msg": message,
-        "post": PostOut.from_orm(post),
-    }
\ No newline at end of file
+    return result
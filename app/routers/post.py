@@ -1,50 +1,89 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, UploadFile, File, Form, Query
 from typing import Optional
 import time
 import logging
-from cloudinary import uploader
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import joinedload
 from app.db.models.user import User
 from app.db.models.like import Like
 from sqlalchemy.orm import Session
-from app.db.session import get_db
-from app.schemas.post import  PostOut, PostOutWithUserLike
-from app.core.security import get_current_user
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_db, get_read_db, get_async_db
+from app.schemas.post import  PostOut, PostOutWithUserLike, PostPage, PostFeedPage
+from app.core.pagination import encode_cursor, created_at_cursor, created_at_before
+from app.core import timeline, like_counter, media
+from app.core.security import get_current_user, Principal
 from app.db.models.post import Post
-from cloudinary.exceptions import Error as CloudinaryError
 
 router = APIRouter()
 
-@router.get("/", response_model=list[PostOutWithUserLike])
+@router.get("/", response_model=PostFeedPage)
 def get_all_posts(
+    cursor: Optional[str] = None,
+    page_size: int = Query(20, ge=1, le=50),
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    # Newest posts first, one page at a time
+    query = db.query(Post).options(joinedload(Post.user))
+    if cursor:
+        query = query.filter(created_at_before(cursor, Post.created_at, Post.id))
+    posts = query.order_by(Post.created_at.desc(), Post.id.desc()).limit(page_size + 1).all()
+
+    has_more = len(posts) > page_size
+    posts = posts[:page_size]
+
+    return {
+        "items": feed_items(db, posts, current_user),
+        "next_cursor": created_at_cursor(posts[-1]) if has_more else None
+    }
+
+
+# Home timeline: own and friends' posts, newest first
+@router.get("/timeline", response_model=PostFeedPage)
+def get_timeline(
+    cursor: Optional[str] = None,
+    page_size: int = Query(20, ge=1, le=50),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    # Get all posts with user relationship loaded
-    posts = db.query(Post)\
-        .options(joinedload(Post.user))\
-        .all()
-    
-    if not posts:
-        raise HTTPException(status_code=404, detail="No posts found")
-
-    # Get IDs of posts liked by current user
+    entries = timeline.read_timeline(db, current_user.id, cursor, page_size + 1)
+    has_more = len(entries) > page_size
+    entries = entries[:page_size]
+
+    post_ids = [post_id for _, post_id in entries]
+    posts_by_id = {
+        post.id: post
+        for post in db.query(Post).options(joinedload(Post.user)).filter(Post.id.in_(post_ids)).all()
+    } if post_ids else {}
+    posts = [posts_by_id[post_id] for post_id in post_ids if post_id in posts_by_id]
+
+    return {
+        "items": feed_items(db, posts, current_user),
+        "next_cursor": encode_cursor(created_at=entries[-1][0].isoformat(), id=entries[-1][1]) if has_more else None
+    }
+
+
+def feed_items(db: Session, posts: list, current_user: Principal) -> list:
+    # Like status only for the posts on this page
     post_ids = [post.id for post in posts]
-    liked_posts = db.query(Like.post_id).filter(
-        Like.user_id == current_user.id,
-        Like.post_id.in_(post_ids)
-    ).all()
-    liked_post_ids = {post_id for (post_id,) in liked_posts}
+    liked_post_ids = set()
+    if post_ids:
+        liked_posts = db.query(Like.post_id).filter(
+            Like.user_id == current_user.id,
+            Like.post_id.in_(post_ids)
+        ).all()
+        liked_post_ids = {post_id for (post_id,) in liked_posts}
 
     # Build response with author name and like status
     return [
         {
             "id": post.id,
             "user_id": post.user_id,
-            "likes_count": post.likes_count,
+            "likes_count": like_counter.counter.count(post),
             "content": post.content,
             "image_url": post.image_url,
+            "image_status": post.image_status,
             "created_at": post.created_at,
             "author_name": f"{post.user.first_name} {post.user.last_name}",
             "is_liked_by_me": post.id in liked_post_ids
@@ -57,10 +96,11 @@ def get_all_posts(
 # Create a new post
 @router.post("/create", response_model=PostOut)
 async def create_post(
+    background_tasks: BackgroundTasks,
     content: str = Form(...),
     post_image: Optional[UploadFile] = File(default=None),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     # try:
     #     # Parse and validate post content
@@ -72,66 +112,69 @@ async def create_post(
     #         detail=str(e)
     #     )
 
-    image_data = {}
-    
-    if post_image and post_image.filename and post_image.size > 0:
+    image = None
 
-        try:
-            # Validate image
-            if post_image.content_type not in ["image/jpeg", "image/png", "image/webp"]:
-                raise HTTPException(400, "Invalid image format")
-            if post_image.size > 5 * 1024 * 1024:  # 5MB
-                raise HTTPException(400, "File too large (max 5MB)")
-
-            # Upload to Cloudinary
-            upload_result = uploader.upload(
-                await post_image.read(),
-                folder="post_images",
-                public_id=f"post_{current_user.id}_{int(time.time())}",
-                resource_type="image",
-                overwrite=True,
-                quality="auto:good"
-            )
-            
-            image_data = {
-                "image_url": upload_result["secure_url"],
-                "image_public_id": upload_result["public_id"]
-            }
-        except CloudinaryError as e:
-            logging.error(f"Cloudinary Error: {str(e)}")
-            raise HTTPException(500, f"Image upload failed: {e}")
+    if post_image and post_image.filename and post_image.size > 0:
+        # Validate image
+        if post_image.content_type not in ["image/jpeg", "image/png", "image/webp"]:
+            raise HTTPException(400, "Invalid image format")
+        if post_image.size > 5 * 1024 * 1024:  # 5MB
+            raise HTTPException(400, "File too large (max 5MB)")
+        image = await post_image.read()
 
     try:
         new_post = Post(
             user_id=current_user.id,
             content=content,
-            **image_data
+            image_status=media.IMAGE_PENDING if image else None
         )
         db.add(new_post)
-        db.commit()
-        db.refresh(new_post)
-        return new_post
+        await db.flush()
+        recipients = await timeline.fan_out_post(db, new_post)
+        await db.commit()
+        await db.refresh(new_post)
+        timeline.publish_post(recipients, new_post)
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f"Database error: {str(e)}")
-        # Cleanup uploaded image if database operation failed
-        if image_data.get("image_public_id"):
-            try:
-                uploader.destroy(image_data["image_public_id"])
-            except CloudinaryError as ce:
-                logging.error(f"Cloudinary cleanup error: {str(ce)}")
         raise HTTPException(500, "Failed to create post")
 
+    # The post is returned straight away, its image is filled in once uploaded
+    if image:
+        background_tasks.add_task(
+            media.attach_post_image,
+            new_post.id,
+            image,
+            f"post_{current_user.id}_{int(time.time())}"
+        )
+    return new_post
+
 #get post of current user
-@router.get("/me", response_model=list[PostOut])
+@router.get("/me", response_model=PostPage)
 def get_my_posts(
+    cursor: Optional[str] = None,
+    page_size: int = Query(20, ge=1, le=50),
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user)
 ):
-    post = db.query(Post).filter(Post.user_id == current_user.id).all()
-    if not post:
-        raise HTTPException(status_code=404, detail="No posts found")
-    return post
+    query = db.query(Post).filter(Post.user_id == current_user.id)
+    if cursor:
+        query = query.filter(created_at_before(cursor, Post.created_at, Post.id))
+    posts = query.order_by(Post.created_at.desc(), Post.id.desc()).limit(page_size + 1).all()
+
+    has_more = len(posts) > page_size
+    posts = posts[:page_size]
+    return {
+        "items": [with_pending_likes(post) for post in posts],
+        "next_cursor": created_at_cursor(posts[-1]) if has_more else None
+    }
+
+
+# Persisted likes_count plus any change the like counter hasn't flushed yet
+def with_pending_likes(post: Post) -> PostOut:
+    post_out = PostOut.from_orm(post)
+    post_out.likes_count = like_counter.counter.count(post)
+    return post_out
 
 
 @router.get("/{post_id}", response_model=PostOut)
@@ -143,12 +186,13 @@ def get_post_by_id(
     post = db.query(Post).filter(Post.id == post_id).first()
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
-    return post  
+    return with_pending_likes(post)
 
 #delete post
 @router.delete("/{post_id}")
 def delete_post(
     post_id: str,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user)
 ):
@@ -159,6 +203,11 @@ def delete_post(
         raise HTTPException(status_code=403, detail="Not authorized to delete this post")
 
     message = "Post deleted successfully"    
+    recipients = timeline.remove_post(db, post.id)
+    image_public_id = post.image_public_id
     db.delete(post)
     db.commit()
+    timeline.publish_invalidate(recipients)
+    if image_public_id:
+        background_tasks.add_task(media.destroy, image_public_id)
     return {"msg": message}  
\ No newline at end of file
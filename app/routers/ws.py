@@ -0,0 +1,234 @@
+"""One multiplexed websocket per client for direct messages, group chats and
+notifications.
+
+Frames from the client:
+
+    {"op": "subscribe", "channel": "dm:<friend_id>" | "group:<group_id>" | "notifications",
+     "last_seen_id": <optional, notifications only>}
+    {"op": "unsubscribe", "channel": ...}
+    {"op": "send", "channel": "dm:<friend_id>" | "group:<group_id>", "message": "..."}
+    {"op": "typing", "channel": "dm:<friend_id>" | "group:<group_id>"}
+    {"op": "heartbeat", "state": "online" | "away"}
+    {"op": "presence", "ids": [<friend ids>]}
+    {"op": "ping"}
+
+Frames to the client:
+
+    {"op": "subscribed" | "unsubscribed", "channel": ...}
+    {"op": "ack", "channel": ..., "id": <message id>}
+    {"op": "error", "channel": ..., "error": "..."}
+    {"op": "presence", "data": {"<friend id>": "online" | "away" | "offline"}}
+    {"channel": ..., "event": "message" | "typing" | "notifications", "data": ...}
+
+Typing indicators and presence never touch the database.
+
+Events are routed through the same pub/sub channels as the per-chat
+endpoints, so clients on either can talk to each other.
+"""
+import asyncio
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from app.db.session import AsyncSessionLocal
+from app.core.security import get_websocket_user, async_are_friends, Principal
+from app.core.outbound import OutboundQueue, dumps
+from app.core.registry import Connection, registry
+from app.core import notifications, presence, pubsub
+from app.core.friends import async_get_friend_ids
+from app.routers.chat import manager, group_manager, store_direct_message, store_group_message, async_is_group_member
+
+router = APIRouter()
+
+NOTIFICATIONS = "notifications"
+
+
+def parse_channel(name) -> tuple:
+    """("dm", friend_id), ("group", group_id) or ("notifications", None); None if invalid."""
+    if name == NOTIFICATIONS:
+        return NOTIFICATIONS, None
+    kind, _, target = str(name).partition(":")
+    if kind in ("dm", "group") and target.isdigit():
+        return kind, int(target)
+    return None
+
+
+def pubsub_channel(user: Principal, kind: str, target_id) -> str:
+    if kind == "dm":
+        return manager.channel(tuple(sorted([user.id, target_id])))
+    if kind == "group":
+        return group_manager.channel(target_id)
+    return notifications.channel(user.id)
+
+
+# Delivery, called with the local connections subscribed to the channel
+
+def _event(event: dict) -> tuple:
+    if "message" in event:
+        return "message", event["message"]
+    return event["event"], event["data"]
+
+
+def deliver_direct(event: dict, connections: list):
+    recipient_id = event["to"]
+    sender_id = event["room"][0] if event["room"][1] == recipient_id else event["room"][1]
+    kind, data = _event(event)
+    text = None
+    for connection in connections:
+        if connection.user_id == recipient_id:
+            text = text or dumps({"channel": f"dm:{sender_id}", "event": kind, "data": data})
+            connection.outbound.send_text(text)
+
+
+def deliver_group(event: dict, connections: list):
+    kind, data = _event(event)
+    text = dumps({"channel": f"group:{event['group_id']}", "event": kind, "data": data})
+    for connection in connections:
+        # Typing indicators aren't echoed back to the typist
+        if kind != "typing" or connection.user_id != data["user_id"]:
+            connection.outbound.send_text(text)
+
+
+def deliver_notifications(event: dict, connections: list):
+    for connection in connections:
+        if connection.wakeup is not None:
+            connection.wakeup.set()
+
+
+async def push_notifications(connection: Connection, last_seen_id):
+    async def send(batch):
+        connection.outbound.send_json({"channel": NOTIFICATIONS, "event": "notifications", "data": batch})
+
+    while True:
+        connection.wakeup.clear()
+        last_seen_id = await notifications.push_new(send, connection.user_id, last_seen_id)
+        await connection.wakeup.wait()
+
+
+async def can_subscribe(user: Principal, kind: str, target_id) -> bool:
+    if kind == NOTIFICATIONS:
+        return True
+    async with AsyncSessionLocal() as db:
+        if kind == "dm":
+            return await async_are_friends(db, user.id, target_id)
+        return await async_is_group_member(db, target_id, user.id)
+
+
+async def ack_when_durable(connection: Connection, name: str, durable: asyncio.Future, message_id: int):
+    try:
+        await durable
+        connection.outbound.send_json({"op": "ack", "channel": name, "id": message_id})
+    except Exception:
+        connection.outbound.send_json({"op": "error", "channel": name, "error": "Message was not saved"})
+
+
+async def handle_frame(connection: Connection, frame: dict, token: str):
+    op, name = frame.get("op"), frame.get("channel")
+    if op == "ping":
+        presence.heartbeat(connection.user_id)
+        connection.outbound.send_json({"op": "pong"})
+        return
+    if op == "heartbeat":
+        presence.heartbeat(connection.user_id, frame.get("state", "online"))
+        return
+    if op == "presence":
+        ids = frame.get("ids")
+        if not isinstance(ids, list) or len(ids) > presence.MAX_BULK_IDS:
+            connection.outbound.send_json({"op": "error", "error": "Invalid ids"})
+            return
+        async with AsyncSessionLocal() as db:
+            friend_ids = await async_get_friend_ids(db, connection.user_id)
+        connection.outbound.send_json({"op": "presence", "data": presence.friend_states(ids, friend_ids)})
+        return
+
+    parsed = parse_channel(name)
+    if parsed is None:
+        connection.outbound.send_json({"op": "error", "channel": name, "error": "Unknown channel"})
+        return
+    kind, target_id = parsed
+    channel = pubsub_channel(connection.user, kind, target_id)
+
+    if op == "subscribe":
+        if channel not in connection.channels:
+            if not await can_subscribe(connection.user, kind, target_id):
+                connection.outbound.send_json({"op": "error", "channel": name, "error": "Not allowed"})
+                return
+            if kind == "dm":
+                registry.subscribe(connection, channel, name, deliver_direct)
+            elif kind == "group":
+                registry.subscribe(connection, channel, name, deliver_group)
+            else:
+                # Subscribe before the catch-up read so nothing committed in between is missed
+                connection.wakeup = asyncio.Event()
+                registry.subscribe(connection, channel, name, deliver_notifications)
+                connection.start_task(name, push_notifications(connection, frame.get("last_seen_id")))
+        connection.outbound.send_json({"op": "subscribed", "channel": name})
+
+    elif op == "unsubscribe":
+        registry.unsubscribe(connection, channel)
+        connection.stop_task(name)
+        if kind == NOTIFICATIONS:
+            connection.wakeup = None
+        connection.outbound.send_json({"op": "unsubscribed", "channel": name})
+
+    elif op == "typing":
+        # Relayed to the other side only, never stored
+        if kind == NOTIFICATIONS or channel not in connection.channels:
+            connection.outbound.send_json({"op": "error", "channel": name, "error": "Subscribe before sending"})
+            return
+        typing = {"event": "typing", "data": {"user_id": connection.user_id}}
+        if kind == "dm":
+            room_id = tuple(sorted([connection.user_id, target_id]))
+            pubsub.publish(channel, {"room": room_id, "to": target_id, **typing})
+        else:
+            pubsub.publish(channel, {"group_id": target_id, **typing})
+
+    elif op == "send":
+        if kind == NOTIFICATIONS or channel not in connection.channels:
+            connection.outbound.send_json({"op": "error", "channel": name, "error": "Subscribe before sending"})
+            return
+        if not isinstance(frame.get("message"), str):
+            connection.outbound.send_json({"op": "error", "channel": name, "error": "Invalid message format"})
+            return
+        if kind == "dm":
+            message_data, durable = await store_direct_message(connection.user, target_id, frame["message"], token)
+            connection.outbound.send_json({"channel": name, "event": "message", "data": message_data})
+            await manager.send_personal_message(message_data, connection.user_id, target_id)
+        else:
+            message_data, durable = await store_group_message(connection.user, target_id, frame["message"], token)
+            await group_manager.broadcast(message_data, target_id)
+        if durable:
+            asyncio.create_task(ack_when_durable(connection, name, durable, message_data["id"]))
+        else:
+            connection.outbound.send_json({"op": "ack", "channel": name, "id": message_data["id"]})
+
+    else:
+        connection.outbound.send_json({"op": "error", "channel": name, "error": "Unknown op"})
+
+
+@router.websocket("/ws")
+async def multiplexed_websocket(websocket: WebSocket, token: str):
+    await websocket.accept()
+    async with AsyncSessionLocal() as db:
+        user = await get_websocket_user(token, db)
+    if not user:
+        await websocket.send_json({"op": "error", "error": "Invalid token"})
+        await websocket.close(code=1008)
+        return
+
+    connection = Connection(user, OutboundQueue(websocket))
+    registry.add(connection)
+    presence.connected(user.id)
+    try:
+        while True:
+            try:
+                frame = await websocket.receive_json()
+            except ValueError:
+                connection.outbound.send_json({"op": "error", "error": "Invalid JSON"})
+                continue
+            if not isinstance(frame, dict):
+                connection.outbound.send_json({"op": "error", "error": "Invalid frame"})
+                continue
+            await handle_frame(connection, frame, token)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        registry.remove(connection)
+        presence.disconnected(user.id)
@@ -11,6 +11,7 @@ class GroupCreate(BaseModel):
     member_ids: Optional[List[int]] = []
 
 class GroupMessage(BaseModel):
+    id: int
     sender_id: int
     content: str
     timestamp: datetime
@@ -18,6 +19,11 @@ class GroupMessage(BaseModel):
     class Config:
         from_attributes = True
 
+class GroupMessagePage(BaseModel):
+    items: List[GroupMessage]
+    next_cursor: Optional[str] = None  # older messages
+    prev_cursor: Optional[str] = None  # newer messages
+
 class GroupMemberAdd(BaseModel):
     user_ids: List[int]
 
@@ -1,8 +1,10 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import List, Optional
 
 
 class MessageBase(BaseModel):
+    id: int
     sender_id: int
     receiver_id: int
     content: str
@@ -10,4 +12,9 @@ class MessageBase(BaseModel):
     is_read: bool
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class MessagePage(BaseModel):
+    items: List[MessageBase]
+    next_cursor: Optional[str] = None  # older messages
+    prev_cursor: Optional[str] = None  # newer messages
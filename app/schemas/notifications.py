@@ -1,6 +1,6 @@
 from datetime import datetime
 from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from typing import List, Optional
 
 class NotificationBase(BaseModel):
     message: str
@@ -25,3 +25,7 @@ class NotificationResponse(BaseModel):
     class Config:
         from_attributes = True
 
+
+class NotificationPage(BaseModel):
+    items: List[NotificationResponse]
+    next_cursor: Optional[str] = None  # older notifications
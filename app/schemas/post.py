@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import Optional, List
 
 class PostBase(BaseModel):
     content: str
@@ -16,6 +16,7 @@ class PostOut(PostBase):
     user_id: int
     created_at: datetime
     likes_count: int
+    image_status: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -26,3 +27,12 @@ class PostOutWithUserLike(PostOut):
 
     class Config:
         from_attributes = True
+
+
+class PostPage(BaseModel):
+    items: List[PostOut]
+    next_cursor: Optional[str] = None
+
+class PostFeedPage(BaseModel):
+    items: List[PostOutWithUserLike]
+    next_cursor: Optional[str] = None
@@ -9,4 +9,7 @@ class Token(BaseModel):
 
 
 class TokenData(BaseModel):
-    email: Optional[EmailStr] = None
\ No newline at end of file
+    email: Optional[EmailStr] = None
+    user_id: Optional[int] = None
+    role: Optional[str] = None
+    is_verified: Optional[bool] = None
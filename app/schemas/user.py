@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Optional
 
 class UserBase(BaseModel):
     email: EmailStr
@@ -37,4 +37,11 @@ class ConnectionRequestWithUser(UserOut):
     request_id: int
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class SuggestedUserOut(UserOut):
+    mutual_friends: int
+
+class SuggestedUserPage(BaseModel):
+    items: List[SuggestedUserOut]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,77 @@
+"""Chat messages persisted per second, one transaction per message versus the
+write-behind writer.
+
+Each of --senders coroutines stores messages between two existing users as
+fast as it can, waiting until every message is durable. Run against a
+scratch database migrated to head, since the messages are left in place:
+
+    python benchmarks/chat_write_behind.py --sender 1 --receiver 2 --messages 5000 --senders 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.models.message import Message
+from app.db.session import AsyncSessionLocal, async_engine
+from app.core import conversations
+from app.core.chat_writer import ChatWriter, FLUSH_MS, FLUSH_BATCH
+
+
+def new_message(args, i: int) -> Message:
+    return Message(sender_id=args.sender, receiver_id=args.receiver, content=f"bench {i}", timestamp=datetime.utcnow())
+
+
+async def per_message(args, counter):
+    async with AsyncSessionLocal() as db:
+        while (i := next(counter, None)) is not None:
+            message = new_message(args, i)
+            db.add(message)
+            await db.flush()
+            await db.execute(conversations.record_message_statement(message))
+            await db.commit()
+
+
+async def write_behind(args, counter, writer: ChatWriter):
+    while (i := next(counter, None)) is not None:
+        message = new_message(args, i)
+        message.id = await writer.message_ids.next()
+        await writer.submit(message)
+
+
+async def measure(name: str, args, sender) -> float:
+    counter = iter(range(args.messages))
+    started = time.perf_counter()
+    await asyncio.gather(*(sender(args, counter) for _ in range(args.senders)))
+    elapsed = time.perf_counter() - started
+    rate = args.messages / elapsed
+    print(f"{name:<14} {args.messages} messages in {elapsed:6.2f}s  {rate:8.0f} msg/s")
+    return rate
+
+
+async def main(args):
+    baseline = await measure("per-message", args, per_message)
+
+    writer = ChatWriter(args.flush_ms, args.flush_batch)
+    writer.start()
+    try:
+        batched = await measure("write-behind", args, lambda a, c: write_behind(a, c, writer))
+    finally:
+        await writer.stop()
+    print(f"speedup        {batched / baseline:.1f}x")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sender", type=int, required=True)
+    parser.add_argument("--receiver", type=int, required=True)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--senders", type=int, default=50, help="concurrent sockets")
+    parser.add_argument("--flush-ms", type=float, default=FLUSH_MS)
+    parser.add_argument("--flush-batch", type=int, default=FLUSH_BATCH)
+    asyncio.run(main(parser.parse_args()))
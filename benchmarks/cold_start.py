@@ -0,0 +1,59 @@
+"""Cold-start time of the app.
+
+Reports how long `import main` takes in a fresh interpreter and how long a
+fresh uvicorn worker takes until it answers its first request.
+
+    python benchmarks/cold_start.py --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_import() -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import main"], cwd=ROOT, check=True)
+    return time.perf_counter() - started
+
+
+def time_first_response(port: int, timeout: float) -> float:
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/openapi.json", timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError("server did not respond")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    imports = [time_import() for _ in range(args.runs)]
+    boots = [time_first_response(args.port, args.timeout) for _ in range(args.runs)]
+    print(f"import main:     median={statistics.median(imports) * 1000:.0f}ms max={max(imports) * 1000:.0f}ms")
+    print(f"first response:  median={statistics.median(boots) * 1000:.0f}ms max={max(boots) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Event-loop lag under mixed HTTP and websocket load.
+
+Opens a set of chat websockets and measures the echo round trip of each
+message while a burst of login / create-post requests hits the same worker.
+A blocked event loop shows up directly as echo latency, so run this once
+against the old tree and once against the current one and compare.
+
+    uvicorn main:app --workers 1
+    python benchmarks/event_loop_lag.py --email a@x.com --password pw \
+        --friend-id 2 --sockets 20 --http-concurrency 20 --duration 15
+
+Requires `httpx` (pip install httpx) in addition to the app requirements.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+import websockets
+
+
+async def get_token(client: httpx.AsyncClient, email: str, password: str) -> str:
+    resp = await client.post("/api/auth/login", data={"username": email, "password": password})
+    resp.raise_for_status()
+    return resp.json()["access_token"]
+
+
+async def socket_worker(ws_url: str, stop: asyncio.Event, samples: list, interval: float):
+    async with websockets.connect(ws_url) as ws:
+        while not stop.is_set():
+            started = time.perf_counter()
+            await ws.send(json.dumps({"message": "ping"}))
+            # The sender gets its own message echoed back once it is persisted
+            await ws.recv()
+            samples.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(interval)
+
+
+async def http_worker(client: httpx.AsyncClient, args, token: str, stop: asyncio.Event, counter: list):
+    headers = {"Authorization": f"Bearer {token}"}
+    n = 0
+    while not stop.is_set():
+        if n % 2 == 0:
+            await client.post("/api/auth/login", data={"username": args.email, "password": args.password})
+        else:
+            await client.post("/api/posts/create", data={"content": "benchmark"}, headers=headers)
+        n += 1
+        counter[0] += 1
+
+
+def report(label: str, samples: list):
+    if not samples:
+        print(f"{label}: no samples")
+        return
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(
+        f"{label}: n={len(samples)} "
+        f"p50={statistics.median(samples):.1f}ms p99={p99:.1f}ms max={samples[-1]:.1f}ms"
+    )
+
+
+async def run_phase(args, token: str, with_http: bool) -> list:
+    ws_base = args.base_url.replace("http", "ws", 1)
+    ws_url = f"{ws_base}/api/chat/ws/chat/{args.friend_id}?token={token}"
+    stop = asyncio.Event()
+    samples, counter = [], [0]
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        tasks = [
+            asyncio.create_task(socket_worker(ws_url, stop, samples, args.interval))
+            for _ in range(args.sockets)
+        ]
+        if with_http:
+            tasks += [
+                asyncio.create_task(http_worker(client, args, token, stop, counter))
+                for _ in range(args.http_concurrency)
+            ]
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    if with_http:
+        print(f"http requests completed: {counter[0]} ({counter[0] / args.duration:.1f}/s)")
+    return samples
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--friend-id", type=int, required=True)
+    parser.add_argument("--sockets", type=int, default=20)
+    parser.add_argument("--http-concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.base_url) as client:
+        token = await get_token(client, args.email, args.password)
+
+    report("websocket echo (idle)", await run_phase(args, token, with_http=False))
+    report("websocket echo (under HTTP load)", await run_phase(args, token, with_http=True))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
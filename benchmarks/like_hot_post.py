@@ -0,0 +1,128 @@
+"""Likes per second on a single hot post, updating likes_count in each toggle
+versus the write-behind like counter.
+
+Creates a throwaway post and 2 x --likes users, then has --concurrency
+threads like the post as fast as they can, each like from a different user
+in its own transaction, the way parallel requests would. The first half
+likes with the in-statement count update, the second half through the
+counter, whose flush task runs alongside. Afterwards likes_count must equal
+the number of like rows. Run against a scratch database migrated to head;
+the created rows are removed afterwards:
+
+    DB_POOL_SIZE=64 python benchmarks/like_hot_post.py --likes 5000 --concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func
+from app.core.likes import toggle_like_statement, toggle_like_rows_statement
+from app.core.like_counter import LikeCounter, FLUSH_MS
+from app.db.models import User, Post, Like
+from app.db.session import SessionLocal, async_engine
+
+
+def create_fixture(likers: int) -> tuple:
+    tag = uuid.uuid4().hex[:8]
+    db = SessionLocal()
+    try:
+        users = [
+            User(first_name="Like", last_name=f"Bench{i}", email=f"like-bench-{tag}-{i}@example.com", password="x")
+            for i in range(likers + 1)
+        ]
+        db.add_all(users)
+        db.flush()
+        post = Post(user_id=users[0].id, content="hot post", likes_count=0)
+        db.add(post)
+        db.commit()
+        return [u.id for u in users], post.id
+    finally:
+        db.close()
+
+
+def cleanup(user_ids: list):
+    db = SessionLocal()
+    try:
+        # Posts and likes go with their users
+        db.query(User).filter(User.id.in_(user_ids)).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def like_in_place(user_ids: list, post_id: int, counter):
+    db = SessionLocal()
+    try:
+        for user_id in user_ids:
+            db.execute(toggle_like_statement(user_id, post_id))
+            db.commit()
+    finally:
+        db.close()
+
+
+def like_write_behind(user_ids: list, post_id: int, counter: LikeCounter):
+    db = SessionLocal()
+    try:
+        for user_id in user_ids:
+            delta = db.execute(toggle_like_rows_statement(user_id, post_id)).first().delta
+            db.commit()
+            counter.add(post_id, delta)
+    finally:
+        db.close()
+
+
+async def measure(name: str, args, like, user_ids: list, post_id: int, counter=None) -> float:
+    chunks = [user_ids[i::args.concurrency] for i in range(args.concurrency)]
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        started = time.perf_counter()
+        await asyncio.gather(*(loop.run_in_executor(pool, like, chunk, post_id, counter) for chunk in chunks))
+        elapsed = time.perf_counter() - started
+    rate = len(user_ids) / elapsed
+    print(f"{name:<14} {len(user_ids)} likes in {elapsed:6.2f}s  {rate:8.0f} likes/s")
+    return rate
+
+
+def counts(post_id: int) -> tuple:
+    db = SessionLocal()
+    try:
+        likes_count = db.query(Post.likes_count).filter(Post.id == post_id).scalar()
+        rows = db.query(func.count(Like.id)).filter(Like.post_id == post_id).scalar()
+        return likes_count, rows
+    finally:
+        db.close()
+
+
+async def main(args):
+    user_ids, post_id = create_fixture(2 * args.likes)
+    likers = user_ids[1:]
+    try:
+        baseline = await measure("in-place", args, like_in_place, likers[:args.likes], post_id)
+
+        counter = LikeCounter(args.flush_ms)
+        counter.start()
+        try:
+            batched = await measure("write-behind", args, like_write_behind, likers[args.likes:], post_id, counter)
+        finally:
+            await counter.stop()
+        print(f"speedup        {batched / baseline:.1f}x")
+
+        likes_count, rows = counts(post_id)
+        print(f"likes_count={likes_count} rows={rows} {'ok' if likes_count == rows else 'MISMATCH'}")
+    finally:
+        cleanup(user_ids)
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--likes", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=15, help="parallel requests, at most the pool size")
+    parser.add_argument("--flush-ms", type=float, default=FLUSH_MS)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,68 @@
+"""Login throughput under concurrency, and what it does to other requests.
+
+Fires concurrent logins at a running server while a probe measures the
+latency of a cheap request on the same worker. With bcrypt on the event loop
+the probe stalls for the duration of every hash.
+
+    uvicorn main:app --workers 1
+    python benchmarks/login_throughput.py --email a@x.com --password pw --concurrency 32
+
+Requires `httpx` (pip install httpx).
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def login_worker(client, args, stop, latencies):
+    while not stop.is_set():
+        started = time.perf_counter()
+        resp = await client.post("/api/auth/login", data={"username": args.email, "password": args.password})
+        resp.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def probe(client, stop, latencies):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/openapi.json")
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.05)
+
+
+def summary(samples):
+    if not samples:
+        return "no samples"
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return f"p50={statistics.median(samples):.1f}ms p99={p99:.1f}ms max={samples[-1]:.1f}ms"
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15)
+    args = parser.parse_args()
+
+    stop = asyncio.Event()
+    logins, probes = [], []
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120, limits=limits) as client:
+        tasks = [asyncio.create_task(login_worker(client, args, stop, logins)) for _ in range(args.concurrency)]
+        tasks.append(asyncio.create_task(probe(client, stop, probes)))
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    print(f"logins: {len(logins) / args.duration:.1f}/s {summary(logins)}")
+    print(f"probe during logins: {summary(probes)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""SQL statements and latency per authenticated request, with and without
+the principal cache.
+
+Runs the app in-process against the database configured in .env:
+
+    python benchmarks/principal_queries.py --email a@x.com --password pw --requests 200
+
+Requires `httpx` (used by fastapi.testclient).
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from main import app
+from app.core.security import principal_cache
+from app.db.session import engine, read_engine, async_engine
+
+ENDPOINTS = ["/api/users/me", "/api/posts/timeline", "/api/connections/friends", "/api/chat/all"]
+
+statements = [0]
+
+
+def count_statement(*args):
+    statements[0] += 1
+
+
+def run(client: TestClient, headers: dict, requests: int, cached: bool):
+    principal_cache.clear()
+    ttl = principal_cache.ttl
+    if not cached:
+        principal_cache.ttl = 0
+    try:
+        for path in ENDPOINTS:
+            statements[0] = 0
+            started = time.perf_counter()
+            for _ in range(requests):
+                client.get(path, headers=headers).raise_for_status()
+            elapsed = time.perf_counter() - started
+            print(
+                f"  {path:28} {statements[0] / requests:5.2f} queries/request "
+                f"{elapsed / requests * 1000:7.2f} ms/request"
+            )
+    finally:
+        principal_cache.ttl = ttl
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    for target in {engine, read_engine, async_engine.sync_engine}:
+        event.listen(target, "before_cursor_execute", count_statement)
+
+    with TestClient(app) as client:
+        resp = client.post("/api/auth/login", data={"username": args.email, "password": args.password})
+        resp.raise_for_status()
+        headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+        print("principal cache disabled:")
+        run(client, headers, args.requests, cached=False)
+        print("principal cache enabled:")
+        run(client, headers, args.requests, cached=True)
+
+
+if __name__ == "__main__":
+    main()
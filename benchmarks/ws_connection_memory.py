@@ -0,0 +1,97 @@
+"""Memory per /ws connection in the registry, for many simulated clients.
+
+Builds --connections Connection objects, each with its send queue and writer
+task and subscribed to --dms direct-message channels and --groups group
+channels, then reports the Python heap and RSS growth per connection. No
+sockets or database are involved, so it only measures our own bookkeeping.
+
+    python benchmarks/ws_connection_memory.py --connections 50000 --dms 5 --groups 2
+"""
+import argparse
+import asyncio
+import gc
+import os
+import random
+import resource
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.registry import Connection, ConnectionRegistry
+from app.core.outbound import OutboundQueue
+
+
+class FakeWebSocket:
+    __slots__ = ()
+
+    async def send_text(self, text):
+        pass
+
+    async def close(self, code=1000):
+        pass
+
+
+class FakeUser:
+    __slots__ = ("id",)
+
+    def __init__(self, user_id):
+        self.id = user_id
+
+
+def deliver(event, connections):
+    pass
+
+
+def rss_kb() -> int:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+async def main(args):
+    registry = ConnectionRegistry()
+    rng = random.Random(0)
+    users = args.connections
+
+    gc.collect()
+    tracemalloc.start()
+    heap_before = tracemalloc.get_traced_memory()[0]
+    rss_before = rss_kb()
+
+    connections = []
+    for user_id in range(1, users + 1):
+        connection = Connection(FakeUser(user_id), OutboundQueue(FakeWebSocket(), 256))
+        registry.add(connection)
+        for _ in range(args.dms):
+            friend_id = rng.randint(1, users)
+            low, high = sorted((user_id, friend_id))
+            registry.subscribe(connection, f"chat.{low}.{high}", f"dm:{friend_id}", deliver)
+        for _ in range(args.groups):
+            group_id = rng.randint(1, max(users // 50, 1))
+            registry.subscribe(connection, f"group.{group_id}", f"group:{group_id}", deliver)
+        connections.append(connection)
+    await asyncio.sleep(0)  # let every writer task start and park on its queue
+
+    gc.collect()
+    heap_after = tracemalloc.get_traced_memory()[0]
+    rss_after = rss_kb()
+    tracemalloc.stop()
+
+    print(f"connections      {len(connections)}")
+    print(f"registry         {registry.stats()}")
+    print(f"heap             {(heap_after - heap_before) / 2**20:8.1f} MiB  "
+          f"{(heap_after - heap_before) / len(connections):8.0f} B/connection")
+    print(f"max RSS growth   {(rss_after - rss_before) / 1024:8.1f} MiB  "
+          f"{(rss_after - rss_before) * 1024 / len(connections):8.0f} B/connection (includes tracemalloc overhead)")
+
+    for connection in connections:
+        registry.remove(connection)
+    await asyncio.sleep(0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=50000)
+    parser.add_argument("--dms", type=int, default=5, help="direct-message channels per connection")
+    parser.add_argument("--groups", type=int, default=2, help="group channels per connection")
+    asyncio.run(main(parser.parse_args()))
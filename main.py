@@ -1,17 +1,57 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from app.core.hashing import shutdown_executor
+from app.core import suggestions, pubsub, chat_writer, like_counter, media
 from app.api.v1 import auth, user
-from app.db.base import Base
-from app.db.session import engine
+from app.db.session import get_request_token, mark_recent_write
 from app.routers import post
 from app.routers import like
 from app.routers import admin
 from app.routers import connections
 from app.routers import chat
 from app.routers import groups
+from app.routers import ws
 
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await pubsub.start()
+    if chat_writer.ENABLED:
+        chat_writer.writer.start()
+    if like_counter.ENABLED:
+        like_counter.counter.start()
+    refresh = None
+    if suggestions.REFRESH_SECONDS > 0:
+        refresh = asyncio.create_task(suggestions.refresh_periodically())
+    image_sweep = asyncio.create_task(media.expire_pending_periodically())
+    yield
+    image_sweep.cancel()
+    if refresh:
+        refresh.cancel()
+    if chat_writer.ENABLED:
+        await chat_writer.writer.stop()
+    if like_counter.ENABLED:
+        await like_counter.counter.stop()
+    await pubsub.stop()
+    shutdown_executor()
+    media.shutdown_executor()
+
+
+# Schema is managed by Alembic, see `python -m app.db.bootstrap`
+app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    response = await call_next(request)
+    # Pin the caller to the primary for a short while after a successful write
+    if request.method in ("POST", "PUT", "PATCH", "DELETE") and response.status_code < 400:
+        token = get_request_token(request)
+        if token:
+            mark_recent_write(token)
+    return response
+
 
 app.include_router(auth.router, prefix="/api/auth", tags=["Auth"])
 app.include_router(user.router, prefix="/api/users", tags=["Users"])
@@ -20,4 +60,5 @@ app.include_router(like.router, prefix="/api/likes", tags=["Likes"])
 app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
 app.include_router(connections.router, prefix="/api/connections", tags=["Connections"])
 app.include_router(chat.router, prefix="/api/chat", tags=["Messages"])
-app.include_router(groups.router, prefix="/api/groups", tags=["Groups"])
\ No newline at end of file
+app.include_router(groups.router, prefix="/api/groups", tags=["Groups"])
+app.include_router(ws.router, prefix="/api", tags=["WebSocket"])
\ No newline at end of file
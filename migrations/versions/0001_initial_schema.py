@@ -0,0 +1,136 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("first_name", sa.String(), nullable=False),
+        sa.Column("last_name", sa.String(), nullable=False),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("password", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("role", sa.String()),
+    )
+    op.create_table(
+        "user_info",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("address", sa.String(), nullable=True),
+        sa.Column("phone_number", sa.String(), nullable=True),
+        sa.Column("dob", sa.Date(), nullable=True),
+        sa.Column("passions", sa.String(), nullable=True),
+        sa.Column("is_verified", sa.Boolean()),
+        sa.Column("lifestyle", sa.String(), nullable=True),
+        sa.Column("dietary", sa.String(), nullable=True),
+        sa.Column("available", sa.Boolean()),
+        sa.Column("religion", sa.String(), nullable=True),
+        sa.Column("number_of_children", sa.Integer(), nullable=True),
+        sa.Column("profile_picture", sa.String(), nullable=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("profile_public_id", sa.String(), nullable=True),
+    )
+    op.create_table(
+        "posts",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("image_url", sa.String(), nullable=True),
+        sa.Column("image_public_id", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("likes_count", sa.Integer()),
+    )
+    op.create_table(
+        "likes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("post_id", sa.Integer(), sa.ForeignKey("posts.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_table(
+        "connection_requests",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("sender_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("receiver_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("status", sa.Enum("pending", "accepted", "rejected", name="request_status")),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_table(
+        "notifications",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("message", sa.String()),
+        sa.Column("is_read", sa.Boolean()),
+        sa.Column("type", sa.String()),
+        sa.Column("related_request_id", sa.Integer(), sa.ForeignKey("connection_requests.id")),
+        sa.Column("related_user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_table(
+        "messages",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("sender_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("receiver_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("content", sa.Text()),
+        sa.Column("timestamp", sa.DateTime()),
+        sa.Column("is_read", sa.Boolean()),
+    )
+    op.create_table(
+        "groups",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(100), nullable=False),
+        sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_table(
+        "group_user_association",
+        sa.Column("group_id", sa.Integer(), sa.ForeignKey("groups.id"), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("role", sa.Enum("member", "admin", name="group_roles")),
+        sa.Column("joined_at", sa.DateTime()),
+    )
+    op.create_table(
+        "group_messages",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("group_id", sa.Integer(), sa.ForeignKey("groups.id"), nullable=False),
+        sa.Column("sender_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("timestamp", sa.DateTime()),
+    )
+
+    # Build indexes without holding a write lock on the tables
+    with op.get_context().autocommit_block():
+        op.create_index("ix_users_id", "users", ["id"], postgresql_concurrently=True)
+        op.create_index("ix_users_email", "users", ["email"], unique=True, postgresql_concurrently=True)
+        op.create_index("ix_user_info_id", "user_info", ["id"], postgresql_concurrently=True)
+        op.create_index("ix_posts_id", "posts", ["id"], postgresql_concurrently=True)
+        op.create_index("ix_likes_id", "likes", ["id"], postgresql_concurrently=True)
+
+
+def downgrade():
+    op.drop_table("group_messages")
+    op.drop_table("group_user_association")
+    op.drop_table("groups")
+    op.drop_table("messages")
+    op.drop_table("notifications")
+    op.drop_table("connection_requests")
+    op.drop_table("likes")
+    op.drop_table("posts")
+    op.drop_table("user_info")
+    op.drop_table("users")
+    sa.Enum(name="group_roles").drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name="request_status").drop(op.get_bind(), checkfirst=True)
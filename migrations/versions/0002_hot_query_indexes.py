@@ -0,0 +1,60 @@
+"""indexes for hot query predicates
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_messages_sender_receiver_timestamp", "messages", ["sender_id", "receiver_id", "timestamp"], {}),
+    ("ix_messages_receiver_sender_timestamp", "messages", ["receiver_id", "sender_id", "timestamp"], {}),
+    ("ix_connection_requests_sender_receiver_status", "connection_requests", ["sender_id", "receiver_id", "status"], {}),
+    ("ix_connection_requests_receiver_status", "connection_requests", ["receiver_id", "status"], {}),
+    ("ix_notifications_user_is_read_created_at", "notifications", ["user_id", "is_read", "created_at"], {}),
+    ("ix_notifications_user_created_at", "notifications", ["user_id", "created_at"], {}),
+    ("ix_group_messages_group_timestamp", "group_messages", ["group_id", "timestamp"], {}),
+    ("ix_group_user_association_user_id", "group_user_association", ["user_id"], {}),
+    ("ix_user_info_user_id", "user_info", ["user_id"], {}),
+    ("ix_user_info_unverified", "user_info", ["user_id"], {"postgresql_where": sa.text("is_verified = false")}),
+    ("ix_likes_post_id", "likes", ["post_id"], {}),
+    ("ix_posts_user_created_at", "posts", ["user_id", "created_at"], {}),
+]
+
+
+def upgrade():
+    # Duplicate likes would block the unique index, keep the oldest of each pair
+    op.execute(
+        """
+        DELETE FROM likes a USING likes b
+        WHERE a.user_id = b.user_id AND a.post_id = b.post_id AND a.id > b.id
+        """
+    )
+    op.execute(
+        """
+        UPDATE posts SET likes_count = (SELECT count(*) FROM likes WHERE likes.post_id = posts.id)
+        """
+    )
+
+    with op.get_context().autocommit_block():
+        for name, table, columns, kwargs in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, **kwargs)
+        op.create_index("uq_likes_user_post", "likes", ["user_id", "post_id"], unique=True, postgresql_concurrently=True)
+
+    # Promote the prebuilt unique index to a constraint without a table rescan
+    op.execute("ALTER TABLE likes ADD CONSTRAINT uq_likes_user_post UNIQUE USING INDEX uq_likes_user_post")
+
+
+def downgrade():
+    op.drop_constraint("uq_likes_user_post", "likes", type_="unique")
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,36 @@
+"""id-ordered message indexes for keyset pagination
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index("ix_messages_sender_receiver_id", "messages", ["sender_id", "receiver_id", "id"], postgresql_concurrently=True)
+        op.create_index("ix_messages_receiver_sender_id", "messages", ["receiver_id", "sender_id", "id"], postgresql_concurrently=True)
+        op.create_index("ix_group_messages_group_id_id", "group_messages", ["group_id", "id"], postgresql_concurrently=True)
+        # Histories are now ordered by id, the timestamp variants are unused
+        op.drop_index("ix_messages_sender_receiver_timestamp", table_name="messages", postgresql_concurrently=True)
+        op.drop_index("ix_messages_receiver_sender_timestamp", table_name="messages", postgresql_concurrently=True)
+        op.drop_index("ix_group_messages_group_timestamp", table_name="group_messages", postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index("ix_messages_sender_receiver_timestamp", "messages", ["sender_id", "receiver_id", "timestamp"], postgresql_concurrently=True)
+        op.create_index("ix_messages_receiver_sender_timestamp", "messages", ["receiver_id", "sender_id", "timestamp"], postgresql_concurrently=True)
+        op.create_index("ix_group_messages_group_timestamp", "group_messages", ["group_id", "timestamp"], postgresql_concurrently=True)
+        op.drop_index("ix_messages_sender_receiver_id", table_name="messages", postgresql_concurrently=True)
+        op.drop_index("ix_messages_receiver_sender_id", table_name="messages", postgresql_concurrently=True)
+        op.drop_index("ix_group_messages_group_id_id", table_name="group_messages", postgresql_concurrently=True)
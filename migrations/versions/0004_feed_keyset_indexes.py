@@ -0,0 +1,31 @@
+"""keyset indexes for posts feeds and liked posts
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index("ix_posts_created_at_id", "posts", ["created_at", "id"], postgresql_concurrently=True)
+        op.create_index("ix_posts_user_created_at_id", "posts", ["user_id", "created_at", "id"], postgresql_concurrently=True)
+        op.create_index("ix_likes_user_id_id", "likes", ["user_id", "id"], postgresql_concurrently=True)
+        op.drop_index("ix_posts_user_created_at", table_name="posts", postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index("ix_posts_user_created_at", "posts", ["user_id", "created_at"], postgresql_concurrently=True)
+        op.drop_index("ix_likes_user_id_id", table_name="likes", postgresql_concurrently=True)
+        op.drop_index("ix_posts_user_created_at_id", table_name="posts", postgresql_concurrently=True)
+        op.drop_index("ix_posts_created_at_id", table_name="posts", postgresql_concurrently=True)
@@ -0,0 +1,61 @@
+"""conversation summaries for the chat inbox
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "conversations",
+        sa.Column("user_low_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("user_high_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("last_message_id", sa.Integer(), sa.ForeignKey("messages.id", ondelete="SET NULL"), nullable=True),
+        sa.Column("last_sender_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="SET NULL"), nullable=True),
+        sa.Column("last_message_preview", sa.String(200), nullable=True),
+        sa.Column("last_message_at", sa.DateTime(), nullable=True),
+        sa.Column("unread_low", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("unread_high", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime()),
+    )
+
+    # Summarize existing history, latest message and unread counts per pair
+    op.execute(
+        """
+        INSERT INTO conversations (
+            user_low_id, user_high_id, last_message_id, last_sender_id,
+            last_message_preview, last_message_at, unread_low, unread_high, created_at
+        )
+        SELECT DISTINCT ON (low_id, high_id)
+            low_id, high_id, id, sender_id, left(content, 200), timestamp, unread_low, unread_high, now()
+        FROM (
+            SELECT m.*,
+                least(sender_id, receiver_id) AS low_id,
+                greatest(sender_id, receiver_id) AS high_id,
+                count(*) FILTER (WHERE is_read IS NOT TRUE AND receiver_id < sender_id)
+                    OVER (PARTITION BY least(sender_id, receiver_id), greatest(sender_id, receiver_id)) AS unread_low,
+                count(*) FILTER (WHERE is_read IS NOT TRUE AND receiver_id > sender_id)
+                    OVER (PARTITION BY least(sender_id, receiver_id), greatest(sender_id, receiver_id)) AS unread_high
+            FROM messages m
+            WHERE sender_id IS NOT NULL AND receiver_id IS NOT NULL AND sender_id <> receiver_id
+        ) AS history
+        ORDER BY low_id, high_id, id DESC
+        """
+    )
+
+    op.create_index("ix_conversations_low_last_message", "conversations", ["user_low_id", "last_message_id"])
+    op.create_index("ix_conversations_high_last_message", "conversations", ["user_high_id", "last_message_id"])
+
+
+def downgrade():
+    op.drop_table("conversations")
@@ -0,0 +1,40 @@
+"""per-member read cursors for group chats
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "group_read_cursors",
+        sa.Column("group_id", sa.Integer(), sa.ForeignKey("groups.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("last_read_message_id", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+
+    # Existing members start with everything read rather than a wall of badges
+    op.execute(
+        """
+        INSERT INTO group_read_cursors (group_id, user_id, last_read_message_id, updated_at)
+        SELECT a.group_id, a.user_id, coalesce(max(m.id), 0), now()
+        FROM group_user_association a
+        LEFT JOIN group_messages m ON m.group_id = a.group_id
+        GROUP BY a.group_id, a.user_id
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("group_read_cursors")
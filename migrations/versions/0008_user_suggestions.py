@@ -0,0 +1,33 @@
+"""precomputed friend suggestions
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "user_suggestions",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("suggested_user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("mutual_count", sa.Integer(), nullable=False),
+        sa.Column("rank", sa.Integer(), nullable=False),
+        sa.Column("computed_at", sa.DateTime()),
+    )
+    op.create_index("ix_user_suggestions_user_rank", "user_suggestions", ["user_id", "rank"], unique=True)
+    # Rows are filled by the first refresh, see app.core.suggestions
+
+
+def downgrade():
+    op.drop_index("ix_user_suggestions_user_rank", table_name="user_suggestions")
+    op.drop_table("user_suggestions")
@@ -0,0 +1,40 @@
+"""read watermarks on conversations
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("conversations", sa.Column("read_low_id", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("conversations", sa.Column("read_high_id", sa.Integer(), nullable=False, server_default="0"))
+
+    # Start each side at the newest message it has already read
+    op.execute(
+        """
+        UPDATE conversations c SET
+            read_low_id = coalesce((
+                SELECT max(m.id) FROM messages m
+                WHERE m.sender_id = c.user_high_id AND m.receiver_id = c.user_low_id AND m.is_read
+            ), 0),
+            read_high_id = coalesce((
+                SELECT max(m.id) FROM messages m
+                WHERE m.sender_id = c.user_low_id AND m.receiver_id = c.user_high_id AND m.is_read
+            ), 0)
+        """
+    )
+
+
+def downgrade():
+    op.drop_column("conversations", "read_high_id")
+    op.drop_column("conversations", "read_low_id")
@@ -0,0 +1,53 @@
+"""unread notification counters and id-ordered notification indexes
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # NULL used to mean unread but no filter on is_read = false ever matched it
+    op.execute("UPDATE notifications SET is_read = false WHERE is_read IS NULL")
+    op.alter_column("notifications", "is_read", nullable=False, server_default=sa.false())
+
+    op.create_table(
+        "notification_counters",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("unread_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.execute(
+        """
+        INSERT INTO notification_counters (user_id, unread_count)
+        SELECT user_id, count(*) FROM notifications
+        WHERE user_id IS NOT NULL AND NOT is_read
+        GROUP BY user_id
+        """
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index("ix_notifications_user_is_read_id", "notifications", ["user_id", "is_read", "id"], postgresql_concurrently=True)
+        op.create_index("ix_notifications_user_id_id", "notifications", ["user_id", "id"], postgresql_concurrently=True)
+        # Feeds are now ordered by id, the created_at variants are unused
+        op.drop_index("ix_notifications_user_is_read_created_at", table_name="notifications", postgresql_concurrently=True)
+        op.drop_index("ix_notifications_user_created_at", table_name="notifications", postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index("ix_notifications_user_is_read_created_at", "notifications", ["user_id", "is_read", "created_at"], postgresql_concurrently=True)
+        op.create_index("ix_notifications_user_created_at", "notifications", ["user_id", "created_at"], postgresql_concurrently=True)
+        op.drop_index("ix_notifications_user_is_read_id", table_name="notifications", postgresql_concurrently=True)
+        op.drop_index("ix_notifications_user_id_id", table_name="notifications", postgresql_concurrently=True)
+
+    op.drop_table("notification_counters")
+    op.alter_column("notifications", "is_read", nullable=True, server_default=None)
@@ -0,0 +1,33 @@
+"""upload state for post images
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("posts", sa.Column("image_status", sa.String(16), nullable=True))
+    op.execute("UPDATE posts SET image_status = 'ready' WHERE image_url IS NOT NULL")
+
+    # Only pending posts, for the sweep that expires stuck uploads
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_posts_image_pending_created_at", "posts", ["created_at"],
+            postgresql_where=sa.text("image_status = 'pending'"), postgresql_concurrently=True
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_posts_image_pending_created_at", table_name="posts", postgresql_concurrently=True)
+    op.drop_column("posts", "image_status")
@@ -0,0 +1,34 @@
+"""clamp group read cursors to the group's newest message
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Cursors set past the newest message would hide every later message from unread counts
+    op.execute(
+        """
+        UPDATE group_read_cursors c
+        SET last_read_message_id = coalesce(
+            (SELECT max(m.id) FROM group_messages m WHERE m.group_id = c.group_id), 0
+        )
+        WHERE c.last_read_message_id > coalesce(
+            (SELECT max(m.id) FROM group_messages m WHERE m.group_id = c.group_id), 0
+        )
+        """
+    )
+
+
+def downgrade():
+    pass
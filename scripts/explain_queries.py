@@ -0,0 +1,169 @@
+"""EXPLAIN the router queries and fail on sequential scans of large tables.
+
+Point the .env settings at a scratch database that has been migrated, then
+
+    python scripts/explain_queries.py --seed     # fill it with synthetic rows
+    python scripts/explain_queries.py            # check plans only
+
+Exits non-zero when any plan contains a Seq Scan on a table with more than
+--min-rows rows.
+"""
+import argparse
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, text
+from app.db.session import engine
+from app.core.friends import friend_ids_query
+from app.db.models import (
+    User, UserInfo, Post, Like, ConnectionRequest, Notification, Message, UserSuggestion,
+    GroupMessage, group_user_association, TimelineEntry, Conversation,
+)
+
+ME, FRIEND, GROUP, POST = 1, 2, 1, 1
+
+SEED_SQL = """
+INSERT INTO users (first_name, last_name, email, password, created_at, role)
+SELECT 'First' || i, 'Last' || i, 'user' || i || '@example.com', 'x', now() - (i || ' minutes')::interval,
+       CASE WHEN i % 1000 = 0 THEN 'admin' ELSE 'user' END
+FROM generate_series(1, :users) AS i;
+
+INSERT INTO user_info (user_id, is_verified, available, created_at)
+SELECT id, id % 50 <> 0, false, created_at FROM users;
+
+INSERT INTO connection_requests (sender_id, receiver_id, status, created_at)
+SELECT i, (i + k) % :users + 1,
+       (CASE WHEN k % 3 = 0 THEN 'pending' ELSE 'accepted' END)::request_status, now()
+FROM generate_series(1, :users) AS i, generate_series(1, 10) AS k;
+
+INSERT INTO messages (sender_id, receiver_id, content, timestamp, is_read)
+SELECT i % :users + 1, (i + i % 10 + 1) % :users + 1, 'message ' || i, now() - (i || ' seconds')::interval, i % 4 = 0
+FROM generate_series(1, :messages) AS i;
+
+INSERT INTO notifications (user_id, message, is_read, type, created_at)
+SELECT i % :users + 1, 'notification ' || i, i % 3 = 0, 'connection_request', now() - (i || ' seconds')::interval
+FROM generate_series(1, :users * 10) AS i;
+
+INSERT INTO posts (user_id, content, created_at, likes_count)
+SELECT i % :users + 1, 'post ' || i, now() - (i || ' seconds')::interval, 0
+FROM generate_series(1, :users * 5) AS i;
+
+INSERT INTO likes (user_id, post_id)
+SELECT DISTINCT i % :users + 1, (i * 7) % (:users * 5) + 1
+FROM generate_series(1, :users * 10) AS i;
+
+INSERT INTO groups (name, owner_id, created_at)
+SELECT 'group ' || i, i % :users + 1, now() FROM generate_series(1, :users / 10) AS i;
+
+INSERT INTO group_user_association (group_id, user_id, role, joined_at)
+SELECT DISTINCT g, (g * k) % :users + 1, 'member'::group_roles, now()
+FROM generate_series(1, :users / 10) AS g, generate_series(1, 20) AS k;
+
+INSERT INTO group_messages (group_id, sender_id, content, timestamp)
+SELECT i % (:users / 10) + 1, i % :users + 1, 'group message ' || i, now() - (i || ' seconds')::interval
+FROM generate_series(1, :messages) AS i;
+"""
+
+
+def router_queries():
+    """The hot queries, built the same way the routers build them."""
+    return {
+        "friends.get_friend_ids": friend_ids_query(ME),
+        "chat.get_chat_history": select(Message.id).filter(
+            Message.sender_id == ME, Message.receiver_id == FRIEND, Message.id < 10**9
+        ).order_by(Message.id.desc()).limit(51),
+        "chat.get_all_chats (conversations)": select(Conversation).filter(
+            Conversation.user_high_id == ME, Conversation.last_message_id.isnot(None)
+        ).order_by(Conversation.last_message_id.desc()).limit(51),
+        "chat.get_all_chats (my groups)": select(group_user_association.c.group_id).filter(
+            group_user_association.c.user_id == ME
+        ),
+        "chat.get_all_chats (group last message)": select(GroupMessage).filter(
+            GroupMessage.group_id == GROUP
+        ).order_by(GroupMessage.id.desc()).limit(1),
+        "groups.get_group_messages": select(GroupMessage).filter(
+            GroupMessage.group_id == GROUP, GroupMessage.id < 10**9
+        ).order_by(GroupMessage.id.desc()).limit(51),
+        "connections.get_notifications": select(Notification).filter(
+            Notification.user_id == ME, Notification.id < 10**9
+        ).order_by(Notification.id.desc()).limit(21),
+        "connections.get_notifications_unread": select(Notification).filter(
+            Notification.user_id == ME, Notification.is_read == False, Notification.id < 10**9
+        ).order_by(Notification.id.desc()).limit(21),
+        "connections.websocket_notifications": select(Notification).filter(
+            Notification.user_id == ME, Notification.is_read == False
+        ).order_by(Notification.id).limit(100),
+        "user.get_connection_requests": select(ConnectionRequest).filter(
+            ConnectionRequest.receiver_id == ME, ConnectionRequest.status == "pending"
+        ),
+        "user.get_suggested_users": select(UserSuggestion.suggested_user_id).filter(
+            UserSuggestion.user_id == ME, UserSuggestion.rank > 20
+        ).order_by(UserSuggestion.rank).limit(21),
+        "user.get_user_bio": select(UserInfo).filter(UserInfo.user_id == ME),
+        "user.get_liked_posts": select(Post, Like.id).join(Like, Post.id == Like.post_id).filter(
+            Like.user_id == ME
+        ).order_by(Like.id.desc()).limit(21),
+        "post.get_all_posts": select(Post).order_by(Post.created_at.desc(), Post.id.desc()).limit(21),
+        "like.toogle_like": select(Like).filter(Like.user_id == ME, Like.post_id == POST),
+        "post.get_timeline": select(TimelineEntry.created_at, TimelineEntry.post_id).filter(
+            TimelineEntry.user_id == ME
+        ).order_by(TimelineEntry.created_at.desc(), TimelineEntry.post_id.desc()).limit(200),
+        "post.get_my_posts": select(Post).filter(Post.user_id == ME).order_by(
+            Post.created_at.desc(), Post.id.desc()
+        ).limit(21),
+        "admin.get_unverified_users": select(User, UserInfo).join(UserInfo, User.id == UserInfo.user_id).filter(
+            User.role != "admin", UserInfo.is_verified == False
+        ),
+    }
+
+
+def seq_scans(plan: dict):
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", []):
+        yield from seq_scans(child)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", action="store_true", help="insert synthetic rows first")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--messages", type=int, default=500000)
+    parser.add_argument("--min-rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        if args.seed:
+            if conn.execute(text("SELECT count(*) FROM users")).scalar():
+                sys.exit("Refusing to seed: users table is not empty")
+            for statement in SEED_SQL.split(";"):
+                if statement.strip():
+                    conn.execute(text(statement), {"users": args.users, "messages": args.messages})
+        conn.execute(text("ANALYZE"))
+
+    with engine.connect() as conn:
+        row_counts = dict(conn.execute(text(
+            "SELECT relname, reltuples::bigint FROM pg_class WHERE relkind = 'r'"
+        )).all())
+
+        failures = []
+        for name, query in router_queries().items():
+            sql = str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+            plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            large = [t for t in seq_scans(plan[0]["Plan"]) if row_counts.get(t, 0) > args.min_rows]
+            status = "SEQ SCAN on " + ", ".join(large) if large else "ok"
+            print(f"{name:45} {status}")
+            if large:
+                failures.append(name)
+
+    if failures:
+        sys.exit(f"{len(failures)} queries scan large tables sequentially")
+
+
+if __name__ == "__main__":
+    main()
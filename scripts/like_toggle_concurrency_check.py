@@ -0,0 +1,121 @@
+"""Check that concurrent like toggles never lose or duplicate a like.
+
+Creates a throwaway author, post and --users likers, then runs --toggles
+toggles on that one post from --concurrency threads, each in its own
+session and transaction, the way parallel requests would:
+
+  * every liker toggles a known number of times in order, interleaved with
+    all the other likers, so the final likes_count is exactly the number of
+    likers with an odd toggle count;
+  * --races extra toggles are fired at once by the same liker, which may
+    collapse into one like but must still leave likes_count equal to the
+    number of like rows.
+
+Point the .env settings at a scratch database with migrations applied, then
+
+    python scripts/like_toggle_concurrency_check.py --toggles 500 --concurrency 32
+
+Exits non-zero if likes_count drifts from the rows in likes. The created rows
+are removed afterwards.
+"""
+import argparse
+import os
+import random
+import sys
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func
+from app.core.likes import toggle_like_statement
+from app.db.models import User, Post, Like
+from app.db.session import SessionLocal
+
+
+def toggle(user_id: int, post_id: int, times: int = 1):
+    for _ in range(times):
+        db = SessionLocal()
+        try:
+            db.execute(toggle_like_statement(user_id, post_id))
+            db.commit()
+        finally:
+            db.close()
+
+
+def create_fixture(likers: int) -> tuple:
+    tag = uuid.uuid4().hex[:8]
+    db = SessionLocal()
+    try:
+        users = [
+            User(first_name="Like", last_name=f"Check{i}", email=f"like-check-{tag}-{i}@example.com", password="x")
+            for i in range(likers + 1)
+        ]
+        db.add_all(users)
+        db.flush()
+        post = Post(user_id=users[0].id, content="like toggle check", likes_count=0)
+        db.add(post)
+        db.commit()
+        return [u.id for u in users], post.id
+    finally:
+        db.close()
+
+
+def counts(post_id: int) -> tuple:
+    db = SessionLocal()
+    try:
+        likes_count = db.query(Post.likes_count).filter(Post.id == post_id).scalar()
+        rows = db.query(func.count(Like.id)).filter(Like.post_id == post_id).scalar()
+        return likes_count, rows
+    finally:
+        db.close()
+
+
+def cleanup(user_ids: list):
+    db = SessionLocal()
+    try:
+        # Posts and likes go with their users
+        db.query(User).filter(User.id.in_(user_ids)).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--toggles", type=int, default=500)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--races", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    user_ids, post_id = create_fixture(args.users)
+    author_id, likers = user_ids[0], user_ids[1:]
+    try:
+        random.seed(args.seed)
+        plan = Counter(random.choice(likers) for _ in range(args.toggles))
+        expected = sum(1 for times in plan.values() if times % 2)
+
+        # Each liker's toggles run in order, different likers in parallel
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            list(pool.map(lambda item: toggle(item[0], post_id, item[1]), plan.items()))
+        likes_count, rows = counts(post_id)
+        ok = likes_count == rows == expected
+        print(f"{args.toggles} toggles by {len(plan)} likers: likes_count={likes_count} rows={rows} expected={expected} {'ok' if ok else 'FAILED'}")
+
+        # One liker racing itself
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            list(pool.map(lambda _: toggle(author_id, post_id), range(args.races)))
+        likes_count, rows = counts(post_id)
+        raced_ok = likes_count == rows
+        print(f"{args.races} racing toggles by one liker: likes_count={likes_count} rows={rows} {'ok' if raced_ok else 'FAILED'}")
+    finally:
+        cleanup(user_ids)
+
+    sys.exit(0 if ok and raced_ok else 1)
+
+
+if __name__ == "__main__":
+    main()
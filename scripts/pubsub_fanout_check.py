@@ -0,0 +1,102 @@
+"""Check that pub/sub messages reach subscribers in every worker process.
+
+Starts --workers processes, each with its own PostgresPubSub subscribed to a
+room channel (as a chat worker would be), then publishes from the parent and
+verifies every worker received every message exactly once and in order,
+including one larger than a single NOTIFY payload.
+
+Point the .env settings at any reachable database, then
+
+    python scripts/pubsub_fanout_check.py --workers 4
+
+Exits non-zero if any worker missed, duplicated or reordered a message.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.pubsub import PostgresPubSub
+from app.db.session import SQLALCHEMY_DATABASE_URL
+
+CHANNEL = "chat.1.2"
+
+
+def messages(count: int) -> list:
+    batch = [{"seq": i, "content": f"message {i}"} for i in range(count)]
+    batch.append({"seq": count, "content": "x" * 20000})
+    return batch
+
+
+def worker(index: int, expected: int, ready, results, timeout: float):
+    async def run():
+        backend = PostgresPubSub(SQLALCHEMY_DATABASE_URL)
+        received = []
+        done = asyncio.Event()
+
+        def handler(message):
+            received.append(message["seq"])
+            if len(received) >= expected:
+                done.set()
+
+        backend.subscribe(CHANNEL, handler)
+        await backend.start()
+        # Give the listener time to LISTEN before the parent publishes
+        await asyncio.sleep(1)
+        ready.put(index)
+        try:
+            await asyncio.wait_for(done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        await asyncio.sleep(0.5)  # catch duplicates
+        await backend.close()
+        results.put((index, received))
+
+    asyncio.run(run())
+
+
+async def publish(count: int):
+    backend = PostgresPubSub(SQLALCHEMY_DATABASE_URL)
+    await backend.start()
+    for message in messages(count):
+        backend.publish(CHANNEL, message)
+    await asyncio.sleep(1)
+    await backend.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=15)
+    args = parser.parse_args()
+
+    expected = args.messages + 1
+    ready, results = multiprocessing.Queue(), multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=worker, args=(i, expected, ready, results, args.timeout))
+        for i in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.get(timeout=30)
+
+    asyncio.run(publish(args.messages))
+
+    failed = False
+    for _ in processes:
+        index, received = results.get(timeout=args.timeout + 30)
+        ok = received == list(range(expected))
+        failed |= not ok
+        print(f"worker {index}: {len(received)}/{expected} messages {'ok' if ok else 'FAILED'}")
+    for process in processes:
+        process.join()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Check that open websockets don't starve the HTTP API of DB connections.
+
+Logs in, opens more websockets than the connection pool can hold (pool size
+plus overflow, plus a margin), keeps them idle, then calls HTTP endpoints
+that need the database and fails if any of them stalls. Run against a
+server started with the same .env:
+
+    uvicorn main:app --workers 1
+    python scripts/websocket_pool_check.py --email a@x.com --password pw
+    python scripts/websocket_pool_check.py --email a@x.com --password pw --friend-id 2
+
+With --friend-id, chat sockets to that friend are opened as well.
+
+Requires `httpx` (pip install httpx) and `websockets`.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.session import POOL_OPTIONS
+
+ENDPOINTS = ["/api/users/me", "/api/connections/friends", "/api/chat/all", "/api/posts/timeline"]
+
+
+async def open_sockets(ws_url: str, paths: list) -> list:
+    return await asyncio.gather(*(websockets.connect(ws_url + path) for path in paths))
+
+
+async def main(args):
+    pool_capacity = POOL_OPTIONS["pool_size"] + POOL_OPTIONS["max_overflow"]
+    count = args.sockets or pool_capacity + 10
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        resp = await client.post("/api/auth/login", data={"username": args.email, "password": args.password})
+        resp.raise_for_status()
+        token = resp.json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        paths = [f"/api/connections/ws/notifications?token={token}"] * count
+        if args.friend_id:
+            paths += [f"/api/chat/ws/chat/{args.friend_id}?token={token}"] * count
+        ws_url = args.url.replace("http", "ws", 1)
+        sockets = await open_sockets(ws_url, paths)
+        print(f"opened {len(sockets)} websockets, pool holds {pool_capacity} connections")
+        # Let the handlers finish their setup queries and go idle
+        await asyncio.sleep(1)
+
+        failed = False
+        try:
+            for path in ENDPOINTS:
+                started = time.perf_counter()
+                try:
+                    resp = await client.get(path, headers=headers)
+                    ok = resp.status_code < 500
+                    detail = resp.status_code
+                except httpx.TimeoutException:
+                    ok, detail = False, "timeout"
+                failed |= not ok
+                print(f"{path:<28} {detail}  {(time.perf_counter() - started) * 1000:8.1f} ms  {'ok' if ok else 'FAILED'}")
+        finally:
+            await asyncio.gather(*(socket.close() for socket in sockets))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--friend-id", type=int)
+    parser.add_argument("--sockets", type=int, help="defaults to the pool capacity plus 10")
+    parser.add_argument("--timeout", type=float, default=POOL_OPTIONS["pool_timeout"] / 2)
+    asyncio.run(main(parser.parse_args()))